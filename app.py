@@ -1,28 +1,35 @@
 import os
-from git import Repo
-from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
-from langchain_community.document_loaders.generic import GenericLoader
-from langchain_community.document_loaders.parsers import LanguageParser
-from langchain_huggingface import HuggingFaceEmbeddings,ChatHuggingFace,HuggingFaceEndpoint
-from langchain_community.vectorstores import Chroma
+import uuid
+import shutil
+from langchain_huggingface import ChatHuggingFace,HuggingFaceEndpoint
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
 load_dotenv()
-from src.helper import load_embedding,repo_ingestion
-from flask import Flask,render_template,jsonify,request
+from src.helper import load_embedding,repo_ingestion,build_retriever,clear_index,open_vectorstore,stream_index,StagedChain
+from src.jobs import JobQueue
+from src.metrics import metrics
+from src.tracing import TraceStore,start_trace,tracing_enabled
+from src.stub_llm import load_stub_llm
+from flask import Flask,render_template,jsonify,request,Response,stream_with_context
 app=Flask(__name__)
+# All ingests share repo/ and db/, so they run one at a time
+jobs=JobQueue(os.getenv('JOBS_DB_PATH','jobs.db'),max_concurrent=1)
+# Per-request span trees (and opt-in cProfile reports), next to the chat history
+traces=TraceStore(os.getenv('TRACES_DB_PATH','chat_sessions.db')) if tracing_enabled() else None
 embeddings=load_embedding()
 persist_directory='db'
-vectordb=Chroma(persist_directory=persist_directory,embedding_function=embeddings)
-llm=HuggingFaceEndpoint(
-    repo_id='mistralai/Mistral-7B-Instruct-v0.2',
-    task='text-generation',
-    max_new_tokens=512,
-    temperature=0.7
-)
-model=ChatHuggingFace(llm=llm)
+vectordb=open_vectorstore(persist_directory,embeddings)
+if os.getenv('LLM_BACKEND','huggingface')=='stub':
+    # Offline model with configurable latency, for load tests (benchmarks/load_test.py)
+    model=load_stub_llm()
+else:
+    llm=HuggingFaceEndpoint(
+        repo_id='mistralai/Mistral-7B-Instruct-v0.2',
+        task='text-generation',
+        max_new_tokens=512,
+        temperature=0.7
+    )
+    model=ChatHuggingFace(llm=llm)
 
 # Enhanced RAG chain with expert system prompt for multi-language support
 template = """You are an expert Software Repository Analysis AI Assistant with deep knowledge of multiple programming languages, software engineering, code architecture, and best practices.
@@ -82,83 +89,152 @@ Response Guidelines:
 Answer:"""
 prompt = ChatPromptTemplate.from_template(template)
 
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+def build_chain():
+    # Runs retrieval, prompt formatting and generation as timed stages (see /metrics)
+    return StagedChain(build_retriever(vectordb,persist_directory,k=8),prompt,model)
+
+# Built once and rebuilt only when /chatbot replaces the vector store
+qa = build_chain()
+
+def answer(question):
+    """Answer with the QA chain; returns (answer, {stage: ms})"""
+    timings = {}
+    result = qa.invoke(question, timings)
+    return result, timings
+
+def wants_profile():
+    """Profile this request with cProfile when it carries an X-Profile: 1 header"""
+    return request.headers.get('X-Profile', '').lower() in ('1', 'true', 'yes')
+
+def trace_headers(trace):
+    return {'X-Trace-Id': trace.id} if traces is not None else {}
+
+def server_timing(timings):
+    """Server-Timing header value, e.g. 'retrieve;dur=12.3, prompt;dur=0.8'"""
+    return ', '.join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
 
-qa = (
-    {"context": vectordb.as_retriever(search_type='mmr',search_kwargs={'k':8}) | format_docs, "question": RunnablePassthrough()}
-    | prompt
-    | model
-    | StrOutputParser()
-)
 @app.route('/', methods=["GET", "POST"])
 def index():
     return render_template('index.html')
+def ingest_repository(job, repo_url):
+    """Clone, parse, split and embed a repository; runs on the ingestion job queue"""
+    global vectordb, qa
+    
+    # Clone the repository
+    repo_ingestion(repo_url)
+    job.report('cloned')
+    
+    # Every chunk and symbol points into repo/, which was just re-cloned
+    clear_index('./db', embeddings)
+    
+    # Parse, split, embed and store in bounded batches
+    vectordb, stats = stream_index('repo/', './db', embeddings, include_text=False, progress=job.report)
+    document_count, chunk_count = stats['documents'], stats['chunks']
+    
+    if not document_count:
+        raise ValueError("No code files found in this repository. Please provide a repository with source code files.")
+    
+    if not chunk_count:
+        raise ValueError("No code chunks could be extracted. The Python files might be too small or empty.")
+    qa = build_chain()
+    job.report('embedded', documents=document_count, embedded=chunk_count,
+               skipped_files=stats.get('skipped_files', 0), skipped_bytes=stats.get('skipped_bytes', 0),
+               peak_rss_mb=stats['peak_rss_mb'], chunks_per_sec=stats['embed_chunks_per_sec'])
+    
+    skipped_note = ""
+    if stats.get('skipped_files'):
+        skipped_note = f" Skipped {stats['skipped_files']} vendored, generated or duplicate files ({stats['skipped_bytes'] / 1024:.0f} KB)."
+    near_duplicates = stats.get('near_duplicates', {})
+    if near_duplicates.get('reduction'):
+        skipped_note += f" Near-duplicate chunks collapsed {near_duplicates['chunks_before']} → {near_duplicates['chunks_after']} ({near_duplicates['reduction']:.0%} fewer)."
+    return {"response": f"✓ Repository processed successfully! {chunk_count} code chunks indexed from {document_count} files.{skipped_note} You can now ask questions in the chat below."}
+
 @app.route('/chatbot', methods=["GET", "POST"])
 def gitRepo():
-    global vectordb
-    
     if request.method == 'POST':
         user_input = request.form['question']
-        try:
-            # Clone the repository
-            repo_ingestion(user_input)
-            
-            # Process and store in vector database
-            from src.helper import load_repo, text_splitter
-            documents = load_repo('repo/')
-            
-            if not documents:
-                return jsonify({"response": "Error: No code files found in this repository. Please provide a repository with source code files."})
-            
-            text_chunks = text_splitter(documents)
-            
-            if not text_chunks:
-                return jsonify({"response": "Error: No code chunks could be extracted. The Python files might be too small or empty."})
-            
-            # Recreate vector database with new documents
-            vectordb = Chroma.from_documents(
-                text_chunks, 
-                embedding=embeddings, 
-                persist_directory='./db'
-            )
-            
-            return jsonify({"response": f"✓ Repository processed successfully! {len(text_chunks)} code chunks indexed from {len(documents)} files. You can now ask questions in the chat below."})
-        except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(error_details)
-            return jsonify({"response": f"Error: {str(e)}"})
+        # Ingestion runs in the background; poll /jobs/<job_id> for progress
+        job_id = jobs.submit(f"ingest {user_input}", ingest_repository, user_input)
+        return jsonify({"response": "Indexing started...", "job_id": job_id})
     
     return jsonify({"response": "Please provide a repository URL"})
+
+@app.route('/metrics', methods=["GET"])
+def prometheus_metrics():
+    """Per-stage durations, chunk and token counts in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces', methods=["GET"])
+def list_traces():
+    """Most recent chat turn traces, newest first (?limit=20)"""
+    if traces is None:
+        return jsonify({"error": "Tracing is disabled (TRACE_REQUESTS=0)"}), 404
+    return jsonify(traces.recent(limit=int(request.args.get('limit', 20))))
+
+@app.route('/traces/<trace_id>', methods=["GET"])
+def trace_detail(trace_id):
+    """Span tree, retrieved chunk ids, token counts and any cProfile report of one chat turn"""
+    trace = traces.get(trace_id) if traces is not None else None
+    if trace is None:
+        return jsonify({"error": "Unknown trace"}), 404
+    return jsonify(trace)
+
+@app.route('/jobs', methods=["GET"])
+def list_jobs():
+    return jsonify(jobs.list())
+
+@app.route('/jobs/<job_id>', methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
 @app.route("/get", methods=["GET", "POST"])
 def chat():
     msg = request.form["msg"]
     input = msg
-    print(input)
 
     if input == "clear":
-        os.system("rmdir /s /q repo")
+        shutil.rmtree('repo', ignore_errors=True)
         return "Repository cleared"
 
     try:
-        # Recreate chain with current vectordb
-        qa_chain = (
-            {"context": vectordb.as_retriever(search_type='mmr',search_kwargs={'k':8}) | format_docs, 
-             "question": RunnablePassthrough()}
-            | prompt
-            | model
-            | StrOutputParser()
-        )
-        
-        result = qa_chain.invoke(input)
+        with start_trace('chat', store=traces, profile=wants_profile(), question=input) as trace:
+            result, timings = answer(input)
         
         # Clean up the response
         result = result.strip()
         
-        print(result)
-        return str(result)
+        # Per-stage latency for load tests and browser dev tools; the full trace is at /traces/<id>
+        return Response(str(result), mimetype='text/html',
+                        headers={'Server-Timing': server_timing(timings), **trace_headers(trace)})
     except Exception as e:
         return f"**Error:** {str(e)}\n\nPlease make sure you've added a repository first using the input box above."
+@app.route("/stream", methods=["POST"])
+def chat_stream():
+    """Same as /get, but sends tokens as chunked text/plain while they are generated"""
+    msg = request.form["msg"]
+
+    if msg == "clear":
+        shutil.rmtree('repo', ignore_errors=True)
+        return "Repository cleared"
+
+    profile = wants_profile()
+    trace_id = uuid.uuid4().hex
+
+    def generate():
+        try:
+            with start_trace('chat', store=traces, profile=profile, trace_id=trace_id, question=msg):
+                for token in qa.stream(msg):
+                    yield token
+        except Exception as e:
+            yield f"**Error:** {str(e)}\n\nPlease make sure you've added a repository first using the input box above."
+
+    # Disable proxy buffering so tokens reach the browser immediately
+    headers = {'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+    if traces is not None:
+        headers['X-Trace-Id'] = trace_id
+    return Response(stream_with_context(generate()), mimetype='text/plain', headers=headers)
 if __name__=='__main__':
     app.run(host='0.0.0.0',port=8080,debug=True,use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""Time each ingestion stage on synthetic repositories
+
+Generates a multi-language repository of the requested size, commits it
+and makes a bare clone to serve as a local clone fixture. Then each stage
+is timed separately:
+
+    clone   clone_repository from the bare fixture (CLONE_MODE modes)
+    load    walk + parse (iter_repo_documents)
+    split   text_splitter
+    dedup   near-duplicate collapse
+    embed   embed_documents on every chunk (cold embedding cache)
+    upsert  vector store + BM25 writes (embeddings come from the cache)
+    stream  stream_index end to end (filter, parse, split, embed, upsert),
+            with its own cold embedding cache so it includes the model
+
+Each stage reports seconds, files/sec, chunks/sec and peak RSS. Results
+are written as JSON with --json. Pass --baseline with an earlier result
+file to print the change per stage.
+
+    python benchmarks/bench_ingest.py --files 2000 --json results.json
+    python benchmarks/bench_ingest.py --embedder hash --baseline results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from git import Repo
+from langchain_core.embeddings import Embeddings
+
+LICENSE = '''Copyright (c) {year} Example Corp.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not
+use this file except in compliance with the License. You may obtain a copy
+of the License at http://www.apache.org/licenses/LICENSE-2.0'''
+
+TEMPLATES = {
+    # Python has no block comments; generate_repo prefixes every license line with '# '
+    '.py': ('{license}\n', '''
+class {Name}Service:
+    """Service for {name} records"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_{name}(self, {name}_id):
+        record = self.store.get({name}_id)
+        if record is None:
+            raise KeyError({name}_id)
+        return record
+
+    def list_{name}s(self, limit={n}):
+        return [r for r in self.store.values() if r.active][:limit]
+'''),
+    '.js': ('/* {license} */\n', '''
+export class {Name}Client {{
+  constructor(http) {{
+    this.http = http;
+  }}
+
+  async get{Name}(id) {{
+    const response = await this.http.get(`/api/{name}/${{id}}`);
+    if (!response.ok) throw new Error("failed to load {name} " + id);
+    return response.json();
+  }}
+
+  async list{Name}s(limit = {n}) {{
+    return (await this.http.get(`/api/{name}?limit=${{limit}}`)).json();
+  }}
+}}
+'''),
+    '.go': ('/* {license} */\n\npackage main\n', '''
+type {Name} struct {{
+	ID     int
+	Name   string
+	Active bool
+}}
+
+func Find{Name}(items []{Name}, id int) (*{Name}, error) {{
+	for i := range items {{
+		if items[i].ID == id {{
+			return &items[i], nil
+		}}
+	}}
+	return nil, fmt.Errorf("{name} %d not found (limit {n})", id)
+}}
+'''),
+    '.java': ('/* {license} */\n', '''
+public class {Name}Repository {{
+    private final Map<Integer, {Name}> items = new HashMap<>();
+
+    public {Name} find{Name}(int id) {{
+        {Name} item = items.get(id);
+        if (item == null) {{
+            throw new IllegalArgumentException("{name} " + id + " not found");
+        }}
+        return item;
+    }}
+
+    public List<{Name}> list{Name}s() {{
+        return items.values().stream().limit({n}).collect(Collectors.toList());
+    }}
+}}
+'''),
+    '.rs': ('/* {license} */\n', '''
+pub struct {Name} {{
+    pub id: u64,
+    pub active: bool,
+}}
+
+pub fn find_{name}(items: &[{Name}], id: u64) -> Option<&{Name}> {{
+    items.iter().filter(|item| item.active).find(|item| item.id == id)
+}}
+
+pub fn count_{name}s(items: &[{Name}]) -> usize {{
+    items.iter().take({n}).filter(|item| item.active).count()
+}}
+'''),
+    '.md': ('', '''
+## {Name}
+
+The `{name}` module loads and lists {name} records. Call `get_{name}` with
+an id, or `list_{name}s` for up to {n} active records.
+'''),
+}
+
+WORDS = ['order', 'user', 'invoice', 'payment', 'account', 'session', 'report', 'item',
+         'cart', 'review', 'ticket', 'shipment', 'coupon', 'profile', 'audit', 'token']
+
+def generate_repo(path, files, languages, units_per_file, duplicate_ratio, seed=0):
+    """Write a synthetic repository; returns the number of bytes written"""
+    rng = random.Random(seed)
+    written = []
+    total = 0
+    for i in range(files):
+        ext = languages[i % len(languages)]
+        directory = os.path.join(path, f'pkg{i // 50}', ext.lstrip('.'))
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f'module_{i}{ext}')
+        if written and rng.random() < duplicate_ratio:
+            # Copy-pasted file: same content, different location
+            shutil.copyfile(rng.choice([w for w in written if w.endswith(ext)] or written), file_path)
+        else:
+            header, body = TEMPLATES[ext]
+            license = LICENSE.format(year=2000 + i % 25)
+            if ext == '.py':
+                license = '\n'.join('# ' + line for line in license.splitlines())
+            parts = [header.format(license=license)]
+            for unit in range(units_per_file):
+                word = f'{rng.choice(WORDS)}{i}_{unit}'
+                parts.append(body.format(name=word, Name=word.title().replace('_', ''), n=rng.randint(5, 500)))
+            with open(file_path, 'w') as f:
+                f.write(''.join(parts))
+        written.append(file_path)
+        total += os.path.getsize(file_path)
+    return total
+
+def make_bare_fixture(source_path, bare_path):
+    """Commit the generated tree and make a bare repository to clone from"""
+    repo = Repo.init(source_path)
+    with repo.config_writer() as config:
+        config.set_value('user', 'name', 'bench')
+        config.set_value('user', 'email', 'bench@example.com')
+    repo.git.add(A=True)
+    repo.git.commit('-q', '-m', 'synthetic fixture')
+    Repo.clone_from(source_path, bare_path, bare=True)
+
+class HashEmbeddings(Embeddings):
+    """Deterministic hash-based vectors, for timing everything except the model"""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _vector(self, text):
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=64).digest()
+        return [(digest[i % 64] - 127.5) / 127.5 for i in range(self.dim)]
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+class PeakRSS:
+    """Sample resident memory on a background thread while a stage runs"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+
+    def __enter__(self):
+        from src.helper import current_rss_mb
+        self.sample = current_rss_mb
+        self.peak = self.sample() or 0.0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            self.peak = max(self.peak, self.sample() or 0.0)
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, self.sample() or 0.0)
+
+def timed(results, stage, files, fn):
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        value, chunks = fn()
+        seconds = time.perf_counter() - start
+    results[stage] = {
+        'seconds': round(seconds, 4),
+        'files_per_sec': round(files / seconds, 1) if seconds and files else None,
+        'chunks_per_sec': round(chunks / seconds, 1) if seconds and chunks else None,
+        'peak_rss_mb': round(rss.peak, 1),
+    }
+    row = results[stage]
+    print(f"  {stage:<7} {seconds:>9.3f}s {row['files_per_sec'] or '':>12} {row['chunks_per_sec'] or '':>12} "
+          f"{row['peak_rss_mb']:>10}")
+    return value
+
+def git_revision():
+    try:
+        return Repo(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).head.commit.hexsha
+    except Exception:
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange vs {baseline_path} ({(baseline.get('revision') or '')[:10]}):")
+    for stage, row in results['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if not old or not old['seconds']:
+            continue
+        change = (row['seconds'] - old['seconds']) / old['seconds']
+        print(f"  {stage:<7} {old['seconds']:>9.3f}s -> {row['seconds']:>9.3f}s  {change:+.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--languages', default='.py,.js,.go,.java,.rs,.md',
+                        help='comma-separated extensions to generate')
+    parser.add_argument('--units', type=int, default=4, help='classes/functions per file')
+    parser.add_argument('--duplicates', type=float, default=0.1, help='fraction of copy-pasted files')
+    parser.add_argument('--clone-mode', default=os.getenv('CLONE_MODE', 'shallow'))
+    parser.add_argument('--embedder', choices=['minilm', 'hash'], default='minilm',
+                        help="'hash' skips the model to time the rest of the pipeline")
+    parser.add_argument('--workdir', help='keep generated repos and stores here instead of a temp dir')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='earlier --json output to compare against')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_ingest_')
+    os.makedirs(workdir, exist_ok=True)
+    # A private, cold embedding cache so runs are comparable
+    os.environ['EMBEDDING_CACHE_PATH'] = os.path.join(workdir, 'embedding_cache.db')
+
+    from src.helper import (clone_repository, iter_repo_documents, text_splitter, open_vectorstore,
+                            open_lexical_index, stream_index, load_embedding)
+    from src.near_dup import collapse_near_duplicates
+    from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    languages = [ext.strip() for ext in args.languages.split(',') if ext.strip()]
+    source = os.path.join(workdir, 'source')
+    bare = os.path.join(workdir, 'fixture.git')
+    clone = os.path.join(workdir, 'clone')
+    for path in (source, bare, clone, os.path.join(workdir, 'db'), os.path.join(workdir, 'db_stream')):
+        shutil.rmtree(path, ignore_errors=True)
+    # A reused --workdir must not hand over a warm cache
+    for name in ('embedding_cache.db', 'embedding_cache_stream.db'):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(os.path.join(workdir, name + suffix)):
+                os.remove(os.path.join(workdir, name + suffix))
+    repo_bytes = generate_repo(source, args.files, languages, args.units, args.duplicates)
+    make_bare_fixture(source, bare)
+    if args.embedder == 'hash':
+        embeddings = CachedEmbeddings(HashEmbeddings(), 'bench-hash')
+    else:
+        embeddings = load_embedding()
+
+    files = args.files
+    stages = {}
+    print(f"{files} files ({repo_bytes / 2**20:.1f} MB, {', '.join(languages)}), embedder {args.embedder}")
+    print(f"  {'stage':<7} {'time':>10} {'files/sec':>12} {'chunks/sec':>12} {'peak MB':>10}")
+    timed(stages, 'clone', files, lambda: (clone_repository(bare, clone, modes=args.clone_mode), 0))
+    docs = timed(stages, 'load', files, lambda: (list(iter_repo_documents(clone)), 0))
+    chunks = timed(stages, 'split', files, lambda: (lambda c: (c, len(c)))(text_splitter(docs)))
+    kept = timed(stages, 'dedup', files, lambda: (lambda r: (r[0], len(chunks)))(collapse_near_duplicates(chunks)))
+    timed(stages, 'embed', files,
+          lambda: (embeddings.embed_documents([c.page_content for c in kept]), len(kept)))
+
+    def upsert():
+        directory = os.path.join(workdir, 'db')
+        vectordb = open_vectorstore(directory, embeddings)
+        lexical = open_lexical_index(directory)
+        for start in range(0, len(kept), 256):
+            vectordb.add_documents(kept[start:start + 256])
+            lexical.add_documents(kept[start:start + 256])
+        return None, len(kept)
+    timed(stages, 'upsert', files, upsert)
+
+    del docs, chunks, kept
+    # The embed stage filled the shared cache; give the end-to-end run a cold one
+    cold = CachedEmbeddings(embeddings.embeddings, embeddings.model_name,
+                            EmbeddingCache(os.path.join(workdir, 'embedding_cache_stream.db')))
+    stream_stats = timed(stages, 'stream', files, lambda: (lambda r: (r[1], r[1]['chunks']))(
+        stream_index(clone, os.path.join(workdir, 'db_stream'), cold)))
+
+    results = {
+        'benchmark': 'ingest',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {
+            'files': files, 'languages': languages, 'units': args.units, 'duplicates': args.duplicates,
+            'clone_mode': args.clone_mode, 'embedder': args.embedder,
+            'vector_store': os.getenv('VECTOR_STORE', 'chroma'), 'ingest_workers': os.getenv('INGEST_WORKERS', '1'),
+        },
+        'repo_bytes': repo_bytes,
+        'stream': stream_stats,
+        'stages': stages,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Measure the recall and size of quantized vector stores
+
+Chunks come from a local repository (default: this one). Ground truth is
+an exact float32 cosine search over the same embeddings. Each store mode
+(int8/float16, with and without re-scoring; int8 re-scores with its
+stored residuals) reports recall@k against it, plus in-memory vector
+bytes, file size (int8 residuals included) and query latency.
+
+    python benchmarks/bench_quantization.py --repo path/to/repo --k 8
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.helper import load_and_split, load_embedding
+from src.quantized_store import QuantizedVectorStore
+
+QUERIES = [
+    "What does this repository do?",
+    "Explain the main functions",
+    "How is the code structured?",
+    "Where is the database initialized?",
+    "How are repositories cloned?",
+    "How does the chat history get saved?",
+    "Which function splits documents into chunks?",
+    "How are errors handled?",
+]
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repo', default='.', help='repository to index')
+    parser.add_argument('--k', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=50, help='total queries (fixed questions plus chunk-derived ones)')
+    parser.add_argument('--rescore', type=int, default=4, help='re-score factor for the re-scored runs')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    _, chunks = load_and_split(args.repo)
+    if len(chunks) <= args.k:
+        sys.exit(f"Only {len(chunks)} chunks in {args.repo}; need more than k={args.k}")
+    texts = [chunk.page_content for chunk in chunks]
+    embeddings = load_embedding()
+    exact = normalize(embeddings.embed_documents(texts))
+
+    # Code-flavoured queries: the fixed questions plus the first line of random chunks
+    rng = random.Random(0)
+    queries = list(QUERIES)
+    while len(queries) < args.queries:
+        line = (rng.choice(texts).strip().splitlines() or [''])[0][:200]
+        if line:
+            queries.append(line)
+    query_vectors = normalize([embeddings.embed_query(q) for q in queries])
+    truth = [set(np.argsort(-(exact @ qv))[:args.k].tolist()) for qv in query_vectors]
+
+    results = {
+        'chunks': len(texts),
+        'dim': int(exact.shape[1]),
+        'k': args.k,
+        'float32_vector_bytes': int(exact.nbytes),
+        'modes': [],
+    }
+    print(f"{len(texts)} chunks, {exact.shape[1]} dims, {len(queries)} queries, recall@{args.k} vs exact float32")
+    print(f"  {'mode':<20} {'recall':>7} {'vector MB':>10} {'file MB':>9} {'p50 ms':>8}")
+    print(f"  {'float32 (exact)':<20} {1.0:>7.3f} {exact.nbytes / 2**20:>10.2f} {'':>9} {'':>8}")
+    for dtype in ('int8', 'float16'):
+        directory = tempfile.mkdtemp(prefix=f'bench_{dtype}_')
+        store = QuantizedVectorStore(directory, embeddings, dtype=dtype)
+        store.add_texts(texts, [chunk.metadata for chunk in chunks], ids=[str(i) for i in range(len(texts))])
+        store.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        file_bytes = os.path.getsize(os.path.join(directory, 'vectors.sqlite3'))
+        _, vectors, scales = store._load_matrix()
+        vector_bytes = vectors.nbytes + scales.nbytes
+
+        for rescore in (0, args.rescore):
+            store.rescore = rescore
+            recalls, timings = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                hits = store.similarity_search(query, k=args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+                recalls.append(len({int(doc.id) for doc in hits} & expected) / args.k)
+            mode = {
+                'dtype': dtype,
+                'rescore': rescore,
+                'recall': round(statistics.mean(recalls), 4),
+                'vector_bytes': int(vector_bytes),
+                'file_bytes': file_bytes,
+                'p50_ms': round(statistics.median(timings), 2),
+            }
+            results['modes'].append(mode)
+            label = f"{dtype} rescore={rescore}"
+            print(f"  {label:<20} {mode['recall']:>7.3f} {vector_bytes / 2**20:>10.2f} "
+                  f"{file_bytes / 2**20:>9.2f} {mode['p50_ms']:>8.2f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Measure the latency of the cross-encoder re-rank stage
+
+Chunks come from a local repository (default: this one); each query
+re-ranks RERANK_CANDIDATES random chunks down to k. Reports p50/p95/max
+for a cold score cache and for repeated (cached) queries.
+
+    python benchmarks/bench_rerank.py --repo path/to/repo --queries 50
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.helper import load_and_split
+from src.rerank import CrossEncoderReranker, INITIAL_PAIR_MS
+
+QUERIES = [
+    "What does this repository do?",
+    "Explain the main functions",
+    "How is the code structured?",
+    "What are the key dependencies?",
+    "Where is the database initialized?",
+    "How are repositories cloned?",
+    "How does the chat history get saved?",
+    "Which function splits documents into chunks?",
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(timings):
+    return {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'max_ms': round(max(timings), 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repo', default='.', help='repository to take candidate chunks from')
+    parser.add_argument('--queries', type=int, default=40, help='number of queries per phase')
+    parser.add_argument('--candidates', type=int, default=int(os.getenv('RERANK_CANDIDATES', '50')))
+    parser.add_argument('--k', type=int, default=8)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('RERANK_BUDGET_MS', '300')))
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    _, chunks = load_and_split(args.repo)
+    if len(chunks) < args.candidates:
+        sys.exit(f"Only {len(chunks)} chunks in {args.repo}; need at least {args.candidates}")
+
+    reranker = CrossEncoderReranker(model_name=args.model, budget_ms=args.budget_ms)
+    rng = random.Random(0)
+    workload = [
+        (f"{rng.choice(QUERIES)} #{i}", rng.sample(chunks, args.candidates))
+        for i in range(args.queries)
+    ]
+
+    # Warm up model loading so it doesn't count as re-rank latency, then start
+    # from the same per-pair estimate as a fresh process
+    reranker.rerank("warm up", workload[0][1], args.k)
+    reranker.cache.clear()
+    reranker.timings.clear()
+    reranker.pair_ms = INITIAL_PAIR_MS
+
+    for query, candidates in workload:
+        reranker.rerank(query, candidates, args.k)
+    cold = list(reranker.timings)
+
+    reranker.timings.clear()
+    for query, candidates in workload:
+        reranker.rerank(query, candidates, args.k)
+    warm = list(reranker.timings)
+
+    results = {
+        'model': reranker.model_name,
+        'candidates': args.candidates,
+        'k': args.k,
+        'budget_ms': args.budget_ms,
+        'cold': summarize(cold),
+        'cached': summarize(warm),
+    }
+    print(f"Re-rank {args.candidates} -> {args.k} with {reranker.model_name} (budget {args.budget_ms} ms)")
+    for phase in ('cold', 'cached'):
+        r = results[phase]
+        print(f"  {phase:<7} p50 {r['p50_ms']:>8.2f} ms   p95 {r['p95_ms']:>8.2f} ms   max {r['max_ms']:>8.2f} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Load generator for the Flask app's /get and /chatbot endpoints
+
+By default the app is started in-process with LLM_BACKEND=stub, so no
+model endpoint or network is needed. Use --url to target a running server
+instead (start it with LLM_BACKEND=stub for offline runs).
+
+/chatbot: --ingests requests are submitted concurrently against a local
+synthetic bare-git fixture. Each is followed until its job finishes, and
+submit latency and time to indexed are reported.
+
+/get: --requests questions are sent with --concurrency workers. Reports
+p50/p95/p99 of the total latency and of each stage (retrieve, prompt,
+generate) from the Server-Timing header, plus throughput.
+
+Run it from the repository root: the app works in ./repo and ./db, and
+ingests replace whatever is indexed there.
+
+    python benchmarks/load_test.py --requests 200 --concurrency 8 --json load.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import generate_repo, make_bare_fixture
+
+QUESTIONS = [
+    "What does this repository do?",
+    "Explain the main functions",
+    "How is the code structured?",
+    "What are the key dependencies?",
+    "How are orders looked up by id?",
+    "Which class lists active records?",
+    "Where are errors raised when an item is missing?",
+    "Explain find_user and how it filters results",
+]
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 1)
+    return {'p50': pick(50), 'p95': pick(95), 'p99': pick(99), 'mean': round(statistics.mean(ordered), 1)}
+
+def parse_server_timing(header):
+    timings = {}
+    for part in (header or '').split(','):
+        name, _, rest = part.strip().partition(';')
+        if rest.startswith('dur='):
+            timings[name] = float(rest[4:])
+    return timings
+
+def post(url, fields, timeout=600):
+    data = urllib.parse.urlencode(fields).encode('utf-8')
+    with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=timeout) as response:
+        return response.read().decode('utf-8'), dict(response.headers)
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return json.loads(response.read())
+
+def start_local_server():
+    """Import app.py with the stub LLM and serve it on a free port in this process"""
+    os.environ.setdefault('LLM_BACKEND', 'stub')
+    from werkzeug.serving import make_server
+    import app as flask_app
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = make_server('127.0.0.1', port, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{port}'
+
+def run_ingests(base_url, fixture, count, concurrency):
+    """Submit count ingests at once and follow each job until it finishes"""
+    def one(_):
+        start = time.perf_counter()
+        body, _ = post(f'{base_url}/chatbot', {'question': fixture})
+        submitted = (time.perf_counter() - start) * 1000
+        job_id = json.loads(body)['job_id']
+        while True:
+            job = get_json(f'{base_url}/jobs/{job_id}')
+            if job['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.2)
+        return submitted, (time.perf_counter() - start) * 1000, job['status']
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(count)))
+    return {
+        'requests': count,
+        'failed': sum(1 for _, _, status in results if status != 'done'),
+        'submit_ms': percentiles([r[0] for r in results]),
+        'indexed_ms': percentiles([r[1] for r in results]),
+    }
+
+def run_queries(base_url, count, concurrency):
+    def one(i):
+        start = time.perf_counter()
+        body, headers = post(f'{base_url}/get', {'msg': QUESTIONS[i % len(QUESTIONS)]})
+        total = (time.perf_counter() - start) * 1000
+        return total, parse_server_timing(headers.get('Server-Timing')), body.startswith('**Error:**')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(count)))
+    elapsed = time.perf_counter() - start
+    stages = {}
+    for _, timings, _ in results:
+        for stage, ms in timings.items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        'requests': count,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, _, error in results if error),
+        'throughput_rps': round(count / elapsed, 2),
+        'total_ms': percentiles([r[0] for r in results]),
+        'stages_ms': {stage: percentiles(values) for stage, values in stages.items()},
+    }
+
+def print_row(label, p):
+    if p:
+        print(f"  {label:<10} {p['p50']:>10} {p['p95']:>10} {p['p99']:>10} {p['mean']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='target a running server instead of starting one in-process')
+    parser.add_argument('--requests', type=int, default=100, help='/get requests')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--ingests', type=int, default=1, help='/chatbot requests (0 to query the existing index)')
+    parser.add_argument('--fixture-files', type=int, default=200, help='size of the synthetic repository to ingest')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    base_url = args.url or start_local_server()
+    results = {'benchmark': 'load', 'url': base_url, 'llm_backend': os.getenv('LLM_BACKEND', 'huggingface')}
+    print(f"Target {base_url}")
+
+    if args.ingests:
+        workdir = tempfile.mkdtemp(prefix='load_test_')
+        source = os.path.join(workdir, 'source')
+        fixture = os.path.join(workdir, 'fixture.git')
+        generate_repo(source, args.fixture_files, ['.py', '.js', '.go', '.java'], 4, 0.1)
+        make_bare_fixture(source, fixture)
+        results['chatbot'] = run_ingests(base_url, fixture, args.ingests, args.concurrency)
+        print(f"/chatbot x{args.ingests} (ms)   p50        p95        p99       mean")
+        print_row('submit', results['chatbot']['submit_ms'])
+        print_row('indexed', results['chatbot']['indexed_ms'])
+
+    results['get'] = run_queries(base_url, args.requests, args.concurrency)
+    get = results['get']
+    print(f"/get x{args.requests} @ {args.concurrency} concurrent: {get['throughput_rps']} req/s, {get['errors']} errors")
+    print(f"  {'(ms)':<10} {'p50':>10} {'p95':>10} {'p99':>10} {'mean':>10}")
+    print_row('total', get['total_ms'])
+    for stage, p in get['stages_ms'].items():
+        print_row(stage, p)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import math
+import sqlite3
+import threading
+from array import array
+
+def normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+class AnswerCache:
+    """Per-project cache of answers, matched by question embedding similarity
+
+    Entries are keyed by the commit SHA the project was indexed at, so a
+    re-index makes older answers unreachable; invalidate() also deletes them.
+    A question hits when its cosine similarity with a cached question is at
+    least threshold.
+    """
+
+    def __init__(self, path, threshold=None):
+        if threshold is None:
+            threshold = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_name TEXT NOT NULL,
+                commit_sha TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_answer_cache_project ON answer_cache (project_name, commit_sha)'
+        )
+        self.conn.commit()
+        # (project_name, commit_sha) -> [(unit vector, answer)]
+        self.memory = {}
+
+    def _entries(self, project_name, commit_sha):
+        key = (project_name, commit_sha)
+        if key not in self.memory:
+            rows = self.conn.execute(
+                'SELECT embedding, answer FROM answer_cache WHERE project_name = ? AND commit_sha = ?',
+                key
+            ).fetchall()
+            self.memory[key] = [(array('f', blob).tolist(), answer) for blob, answer in rows]
+        return self.memory[key]
+
+    def lookup(self, project_name, commit_sha, query_vector):
+        """Return the best cached answer above the threshold, or None"""
+        query = normalize(query_vector)
+        best_score, best_answer = self.threshold, None
+        with self.lock:
+            for vector, answer in self._entries(project_name, commit_sha):
+                score = sum(a * b for a, b in zip(query, vector))
+                if score >= best_score:
+                    best_score, best_answer = score, answer
+        return best_answer
+
+    def store(self, project_name, commit_sha, question, query_vector, answer):
+        vector = normalize(query_vector)
+        with self.lock:
+            entries = self._entries(project_name, commit_sha)
+            self.conn.execute(
+                'INSERT INTO answer_cache (project_name, commit_sha, question, embedding, answer) VALUES (?, ?, ?, ?, ?)',
+                (project_name, commit_sha, question, array('f', vector).tobytes(), answer)
+            )
+            self.conn.commit()
+            entries.append((vector, answer))
+
+    def invalidate(self, project_name):
+        """Drop every cached answer for a project"""
+        with self.lock:
+            self.conn.execute('DELETE FROM answer_cache WHERE project_name = ?', (project_name,))
+            self.conn.commit()
+            for key in [k for k in self.memory if k[0] == project_name]:
+                del self.memory[key]
@@ -0,0 +1,46 @@
+import threading
+from collections import OrderedDict
+
+class ChainRegistry:
+    """LRU cache of per-project RAG resources (vector store client, prompt, chain)
+
+    Entries are built on first use by the factory passed to get() and evicted
+    least-recently-used once more than max_size projects are open. Call
+    invalidate() whenever a project's index or metadata changes.
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, project_name, factory):
+        """Return the cached entry for project_name, building it with factory() if needed"""
+        with self.lock:
+            if project_name in self.entries:
+                self.entries.move_to_end(project_name)
+                return self.entries[project_name]
+        entry = factory()
+        if entry is None:
+            # Nothing to cache (e.g. the project has no vector store yet)
+            return None
+        with self.lock:
+            self.entries[project_name] = entry
+            self.entries.move_to_end(project_name)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, project_name):
+        with self.lock:
+            self.entries.pop(project_name, None)
+
+    def invalidate_prefix(self, prefix):
+        """Drop every entry whose name starts with prefix"""
+        with self.lock:
+            for name in [name for name in self.entries if name.startswith(prefix)]:
+                del self.entries[name]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
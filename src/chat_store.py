@@ -0,0 +1,105 @@
+import atexit
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+class ChatStore:
+    """Chat history storage on one shared, WAL-mode SQLite connection
+
+    Writes are buffered and flushed in a single transaction when batch_size
+    messages are pending, every flush_interval seconds from a background
+    thread, before any read, and at interpreter exit. Timestamps are taken
+    when a message is saved, not when it is flushed.
+    """
+
+    def __init__(self, db_path, batch_size=50, flush_interval=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.pending = []
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_name TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_chat_sessions_project_time ON chat_sessions (project_name, timestamp)'
+        )
+        self.conn.commit()
+
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, name='chat-store-flush', daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            self.conn.executemany(
+                'INSERT INTO chat_sessions (project_name, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                self.pending
+            )
+            self.conn.commit()
+            self.pending = []
+
+    def save_message(self, project_name, role, content):
+        # Same format as SQLite's CURRENT_TIMESTAMP (UTC)
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.pending.append((project_name, role, content, timestamp))
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def load_messages(self, project_name, limit=None, before=None):
+        """Return messages oldest-first
+
+        With limit, only the newest `limit` messages are returned; pass the
+        (timestamp, id) of the oldest message already loaded as before to
+        fetch the page preceding it.
+        """
+        query = 'SELECT id, role, content, timestamp FROM chat_sessions WHERE project_name = ?'
+        params = [project_name]
+        if before is not None:
+            query += ' AND (timestamp < ? OR (timestamp = ? AND id < ?))'
+            params += [before[0], before[0], before[1]]
+        query += ' ORDER BY timestamp DESC, id DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            self.flush()
+            rows = self.conn.execute(query, params).fetchall()
+        return [
+            {'id': row[0], 'role': row[1], 'content': row[2], 'timestamp': row[3]}
+            for row in reversed(rows)
+        ]
+
+    def clear(self, project_name):
+        with self.lock:
+            self.flush()
+            self.conn.execute('DELETE FROM chat_sessions WHERE project_name = ?', (project_name,))
+            self.conn.commit()
+
+    def stats(self, project_name):
+        with self.lock:
+            self.flush()
+            return self.conn.execute(
+                'SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM chat_sessions WHERE project_name = ?',
+                (project_name,)
+            ).fetchone()
+
+    def close(self):
+        self.stopped.set()
+        self.flush()
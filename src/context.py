@@ -0,0 +1,85 @@
+import os
+
+_encoding = None
+
+def count_tokens(text):
+    """Token count with tiktoken (cl100k_base), or a chars/4 estimate without it"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text, max_tokens):
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
+
+def _overlap(left, right, min_overlap=20, max_overlap=400):
+    """Length of the longest suffix of left that is a prefix of right"""
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def merge_chunks(docs):
+    """Collapse duplicate, contained and overlapping chunks from the same file
+
+    Returns [(source, text)] ordered by the best rank among the merged chunks.
+    Splitter overlap (chunk_overlap) shows up as a shared suffix/prefix, so
+    neighbouring chunks are stitched back together instead of repeated.
+    """
+    groups = []  # [source, text], kept in rank order
+    for doc in docs:
+        source = doc.metadata.get('source', '')
+        text = doc.page_content
+        for group in groups:
+            if group[0] != source:
+                continue
+            if text in group[1]:
+                break
+            if group[1] in text:
+                group[1] = text
+                break
+            size = _overlap(group[1], text)
+            if size:
+                group[1] = group[1] + text[size:]
+                break
+            size = _overlap(text, group[1])
+            if size:
+                group[1] = text + group[1][size:]
+                break
+        else:
+            groups.append([source, text])
+    return [(source, text) for source, text in groups]
+
+def assemble_context(docs, budget=None):
+    """Build the prompt context from retrieved chunks within a token budget
+
+    Chunks are merged per file, then added in relevance (retrieval) order
+    while they fit in budget tokens (default CONTEXT_TOKEN_BUDGET, 3000).
+    The most relevant chunk is truncated rather than dropped if it alone is
+    over budget.
+    """
+    if budget is None:
+        budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', '3000'))
+    parts = []
+    used = 0
+    for source, text in merge_chunks(docs):
+        block = f"# File: {source}\n{text}" if source else text
+        tokens = count_tokens(block) + 2
+        if used + tokens > budget:
+            if not parts:
+                parts.append(truncate_to_tokens(block, budget))
+                used = budget
+            continue
+        parts.append(block)
+        used += tokens
+    return "\n\n".join(parts)
@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from langchain_core.embeddings import Embeddings
+
+# SQLite caps the number of bound parameters per statement
+_BATCH = 500
+
+def text_hash(text):
+    """Content address of a chunk"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """Persistent (model name, chunk hash) -> vector store backed by SQLite
+
+    Vectors are stored as raw float32 blobs. When the stored vectors exceed
+    max_bytes the least recently used entries are evicted down to 90% of it.
+    """
+
+    def __init__(self, path=None, max_mb=None):
+        if path is None:
+            path = os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.db')
+        if max_mb is None:
+            max_mb = float(os.getenv('EMBEDDING_CACHE_MAX_MB', '512'))
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)')
+        self.conn.commit()
+        # Running total of stored vector bytes, so writes don't re-scan the table
+        self.size = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self.conn.execute('SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings').fetchone()[0]
+
+    def _present(self, model, hashes):
+        present = set()
+        for i in range(0, len(hashes), _BATCH):
+            batch = hashes[i:i + _BATCH]
+            marks = ','.join('?' * len(batch))
+            present.update(row[0] for row in self.conn.execute(
+                f'SELECT hash FROM embeddings WHERE model = ? AND hash IN ({marks})', [model, *batch]
+            ))
+        return present
+
+    def get_many(self, model, hashes):
+        """Return {hash: vector} for the hashes present in the cache"""
+        found = {}
+        now = time.time()
+        with self.lock:
+            for i in range(0, len(hashes), _BATCH):
+                batch = hashes[i:i + _BATCH]
+                marks = ','.join('?' * len(batch))
+                rows = self.conn.execute(
+                    f'SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({marks})',
+                    [model, *batch]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array('f', blob).tolist()
+                if rows:
+                    self.conn.execute(
+                        f'UPDATE embeddings SET last_used = ? WHERE model = ? AND hash IN ({marks})',
+                        [now, model, *batch]
+                    )
+            self.conn.commit()
+        return found
+
+    def put_many(self, model, items):
+        """Store (hash, vector) pairs and evict if the cache grew past its cap"""
+        now = time.time()
+        rows = [(model, h, array('f', vector).tobytes(), now) for h, vector in items]
+        with self.lock:
+            present = self._present(model, [row[1] for row in rows])
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)',
+                rows
+            )
+            self.conn.commit()
+            self.size += sum(len(row[2]) for row in rows if row[1] not in present)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other processes may write to the same file; recount before deleting anything
+        size = self.size = self._stored_bytes()
+        if size <= self.max_bytes:
+            return
+        target = size - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for model, h, length in self.conn.execute(
+            'SELECT model, hash, LENGTH(vector) FROM embeddings ORDER BY last_used'
+        ):
+            stale.append((model, h))
+            freed += length
+            if freed >= target:
+                break
+        self.conn.executemany('DELETE FROM embeddings WHERE model = ? AND hash = ?', stale)
+        self.conn.commit()
+        self.size = size - freed
+
+    def stats(self):
+        with self.lock:
+            count, size = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings'
+            ).fetchone()
+        return {'entries': count, 'bytes': size}
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only runs the model on chunks it hasn't seen before"""
+
+    def __init__(self, embeddings, model_name, cache=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache()
+        self.hits = 0
+        self.misses = 0
+        # Time spent in the model on misses, for throughput that excludes cache hits
+        self.model_seconds = 0.0
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model_name, list(dict.fromkeys(hashes)))
+
+        # Embed each unseen text once, even if it repeats within the batch
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = text
+        if missing:
+            start = time.perf_counter()
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.model_seconds += time.perf_counter() - start
+            new_items = list(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, new_items)
+            found.update(new_items)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        # Queries are one-off; caching them would only churn the store
+        return self.embeddings.embed_query(text)
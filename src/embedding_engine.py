@@ -0,0 +1,57 @@
+import os
+from langchain_core.embeddings import Embeddings
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that feeds the model length-bucketed batches
+
+    Texts are sorted by length and cut into batches of at most batch_size,
+    starting a new batch whenever the longest text would exceed max_spread
+    times the shortest one, so a single 2000-char chunk no longer pads a
+    batch of short ones. Results are returned in the caller's order.
+    """
+
+    def __init__(self, embeddings, batch_size=None, threads=None, max_spread=2.0):
+        if batch_size is None:
+            batch_size = int(os.getenv('EMBED_BATCH_SIZE', '32'))
+        if threads is None and os.getenv('EMBED_THREADS'):
+            threads = int(os.getenv('EMBED_THREADS'))
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_spread = max_spread
+        self.threads = threads
+        if threads:
+            try:
+                import torch
+                torch.set_num_threads(threads)
+            except ImportError:
+                pass
+
+    def make_batches(self, texts):
+        """Group text indices into length buckets"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = []
+        batch = []
+        for i in order:
+            if batch and (
+                len(batch) >= self.batch_size
+                or len(texts[i]) > self.max_spread * max(len(texts[batch[0]]), 1)
+            ):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        vectors = [None] * len(texts)
+        for batch in self.make_batches(texts):
+            embedded = self.embeddings.embed_documents([texts[i] for i in batch])
+            for i, vector in zip(batch, embedded):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
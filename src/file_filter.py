@@ -0,0 +1,164 @@
+import os
+import re
+import fnmatch
+import hashlib
+import subprocess
+
+# Lockfiles and dependency manifests that are large, machine-written and useless to chat about
+LOCKFILES = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml',
+    'composer.lock', 'Gemfile.lock', 'Cargo.lock', 'poetry.lock', 'Pipfile.lock',
+    'go.sum', 'packages.lock.json',
+}
+
+# File names produced by code generators (protobuf, gRPC, Dart, C# designers, ...)
+GENERATED_NAMES = [
+    '*_pb2.py', '*_pb2_grpc.py', '*.pb.go', '*.pb.cc', '*.pb.h', '*.pb.swift',
+    '*_pb.js', '*_pb.d.ts', '*_grpc_pb.js', '*.pb.rs',
+    '*.generated.*', '*_generated.*', '*.g.dart', '*.freezed.dart', '*.designer.cs',
+]
+
+# Headers generators put in a comment at the top of their output: Go's
+# standard line, @generated (Facebook tooling, Rust, Buck) and protoc's banner.
+# Free-text "do not edit" or "auto-generated" also appears in hand-written code.
+GENERATED_MARKER = re.compile(
+    rb'^// Code generated .* DO NOT EDIT\.\r?$'
+    rb'|^\s*(?:#|//|/?\*|--|<!--).*@generated\b'
+    rb'|^\s*(?:#|//) Generated by the protocol buffer compiler\.\s+DO NOT EDIT!',
+    re.MULTILINE
+)
+
+def is_minified(data, max_line=5000, max_average=300):
+    """Minified/bundled code: very long lines or a high average line length"""
+    if len(data) < 1024:
+        return False
+    lines = data.split(b'\n')
+    longest = max(len(line) for line in lines)
+    return longest > max_line or len(data) / len(lines) > max_average
+
+def is_generated(name, data):
+    if any(fnmatch.fnmatch(name, pattern) for pattern in GENERATED_NAMES):
+        return True
+    return bool(GENERATED_MARKER.search(data[:1024]))
+
+def _git_paths(repo_path, args, rel_paths):
+    """Run a git command that reads NUL-separated paths on stdin; None if git can't"""
+    try:
+        result = subprocess.run(
+            ['git', '-C', repo_path, *args, '--stdin', '-z'],
+            input='\0'.join(rel_paths).encode('utf-8'), capture_output=True, timeout=60
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    # check-ignore exits 1 when nothing is ignored; anything else is an error
+    if result.returncode not in (0, 1):
+        return None
+    return result.stdout.decode('utf-8', errors='ignore').split('\0')
+
+def _read_patterns(path):
+    try:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    except OSError:
+        return []
+
+def _pattern_matches(pattern, rel_path):
+    pattern = pattern.rstrip('/')
+    if '/' in pattern.lstrip('/'):
+        return fnmatch.fnmatch(rel_path, pattern.lstrip('/')) or fnmatch.fnmatch(rel_path, pattern.lstrip('/') + '/*')
+    parts = rel_path.split('/')
+    return any(fnmatch.fnmatch(part, pattern) for part in parts)
+
+def ignored_paths(repo_path, rel_paths):
+    """Paths matched by .gitignore, tracked or not
+
+    Uses git check-ignore; without git, falls back to the root .gitignore
+    (no negation or nested files).
+    """
+    output = _git_paths(repo_path, ['check-ignore', '--no-index'], rel_paths)
+    if output is not None:
+        return {path for path in output if path}
+    patterns = [p for p in _read_patterns(os.path.join(repo_path, '.gitignore')) if not p.startswith('!')]
+    return {path for path in rel_paths if any(_pattern_matches(p, path) for p in patterns)}
+
+def attributed_paths(repo_path, rel_paths):
+    """Paths marked linguist-generated or linguist-vendored in .gitattributes"""
+    output = _git_paths(repo_path, ['check-attr', 'linguist-generated', 'linguist-vendored'], rel_paths)
+    if output is not None:
+        # -z output is path, attribute, value triples
+        marked = set()
+        for i in range(0, len(output) - 2, 3):
+            if output[i + 2] in ('set', 'true'):
+                marked.add(output[i])
+        return marked
+    marked = set()
+    for line in _read_patterns(os.path.join(repo_path, '.gitattributes')):
+        pattern, *attributes = line.split()
+        if any(a in ('linguist-generated', 'linguist-generated=true',
+                     'linguist-vendored', 'linguist-vendored=true') for a in attributes):
+            marked.update(path for path in rel_paths if _pattern_matches(pattern, path))
+    return marked
+
+def filter_files(repo_path, entries, max_bytes=None):
+    """Drop files not worth chunking before they are parsed and embedded
+
+    entries are the walker's (file_path, ext) pairs; the kept ones are
+    returned in the same order along with a report of what was skipped,
+    by reason: gitignored, linguist attribute, size cap (MAX_FILE_BYTES,
+    default 1 MB), lockfile, minified, generated and byte-identical
+    duplicate (the first copy in walk order is kept). The report's
+    'duplicate_files' maps the path of each kept first copy to the
+    repo-relative paths of the copies skipped in its favour.
+    """
+    if max_bytes is None:
+        max_bytes = int(os.getenv('MAX_FILE_BYTES', str(1024 * 1024)))
+    rel_paths = [os.path.relpath(path, repo_path).replace(os.sep, '/') for path, _ in entries]
+    ignored = ignored_paths(repo_path, rel_paths) if rel_paths else set()
+    attributed = attributed_paths(repo_path, rel_paths) if rel_paths else set()
+
+    kept = []
+    seen = {}  # content digest -> path of its first copy
+    duplicate_files = {}
+    reasons = {}
+    for (path, ext), rel_path in zip(entries, rel_paths):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        name = os.path.basename(path)
+        reason = None
+        if rel_path in ignored:
+            reason = 'gitignored'
+        elif rel_path in attributed:
+            reason = 'linguist'
+        elif size > max_bytes:
+            reason = 'too_large'
+        elif name in LOCKFILES:
+            reason = 'lockfile'
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha1(data).digest()
+            if digest in seen:
+                reason = 'duplicate'
+                duplicate_files.setdefault(seen[digest], []).append(rel_path)
+            elif name.endswith(('.min.js', '.min.css')) or is_minified(data):
+                reason = 'minified'
+            elif is_generated(name, data):
+                reason = 'generated'
+            seen.setdefault(digest, path)
+        if reason:
+            skipped = reasons.setdefault(reason, {'files': 0, 'bytes': 0})
+            skipped['files'] += 1
+            skipped['bytes'] += size
+        else:
+            kept.append((path, ext))
+
+    report = {
+        'files': len(kept),
+        'skipped_files': sum(r['files'] for r in reasons.values()),
+        'skipped_bytes': sum(r['bytes'] for r in reasons.values()),
+        'reasons': reasons,
+        'duplicate_files': duplicate_files,
+    }
+    return kept, report
@@ -1,12 +1,30 @@
 import os
+import time
+import uuid
+from collections import deque
+from functools import partial
+from pathlib import Path
 from git import Repo
 from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
-from langchain_community.document_loaders.generic import GenericLoader
+from langchain_community.document_loaders import TextLoader
+from langchain_community.document_loaders.blob_loaders import Blob
 from langchain_community.document_loaders.parsers import LanguageParser
 from langchain_huggingface import HuggingFaceEmbeddings,ChatHuggingFace,HuggingFaceEndpoint
 from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
 from dotenv import load_dotenv
 load_dotenv()
+from src.embedding_cache import CachedEmbeddings
+from src.embedding_engine import BatchedEmbeddings
+from src.lexical_index import LexicalIndex, HybridRetriever, chunk_key
+from src.symbol_index import SymbolIndex, SymbolRetriever, extract_symbols
+from src.rerank import RerankingRetriever, get_reranker
+from src.quantized_store import QuantizedVectorStore
+from src.file_filter import filter_files
+from src.near_dup import NearDuplicateIndex, DuplicateIndex, collapse_near_duplicates, mark_duplicates, reduction_report
+from src.metrics import metrics, TimedEmbeddings
+from src.context import assemble_context, count_tokens
+from src.tracing import annotate
 def repo_ingestion(repo_url):
     import shutil
     repo_path = "repo/"
@@ -18,104 +36,773 @@ def repo_ingestion(repo_url):
             func(path)
         shutil.rmtree(repo_path, onerror=handle_remove_readonly)
     os.makedirs('repo',exist_ok=True)
-    Repo.clone_from(repo_url,to_path=repo_path)
+    clone_repository(repo_url,repo_path)
 
-def load_repo(repo_path):
-    """Load all code files from repository - supports multiple languages"""
-    all_documents = []
-    
-    # Define language mappings
-    language_map = {
-        '.py': Language.PYTHON,
-        '.js': Language.JS,
-        '.ts': Language.JS,
-        '.jsx': Language.JS,
-        '.tsx': Language.JS,
-        '.java': Language.JAVA,
-        '.cpp': Language.CPP,
-        '.c': Language.C,
-        '.cs': Language.CSHARP,
-        '.go': Language.GO,
-        '.rb': Language.RUBY,
-        '.php': Language.PHP,
-        '.rs': Language.RUST,
-        '.kt': Language.KOTLIN,
-        '.swift': Language.SWIFT,
-        '.scala': Language.SCALA,
-        '.html': Language.HTML,
-        '.md': Language.MARKDOWN,
-    }
-    
-    # Load files by language
-    for ext, lang in language_map.items():
+# Define language mappings
+LANGUAGE_MAP = {
+    '.py': Language.PYTHON,
+    '.js': Language.JS,
+    '.ts': Language.JS,
+    '.jsx': Language.JS,
+    '.tsx': Language.JS,
+    '.java': Language.JAVA,
+    '.cpp': Language.CPP,
+    '.c': Language.C,
+    '.cs': Language.CSHARP,
+    '.go': Language.GO,
+    '.rb': Language.RUBY,
+    '.php': Language.PHP,
+    '.rs': Language.RUST,
+    '.kt': Language.KOTLIN,
+    '.swift': Language.SWIFT,
+    '.scala': Language.SCALA,
+    '.html': Language.HTML,
+    '.md': Language.MARKDOWN,
+}
+
+# Common text files (README, config files, etc.)
+TEXT_EXTENSIONS = ['.txt', '.json', '.yaml', '.yml', '.toml', '.ini', '.cfg', '.conf', '.xml']
+
+# Directories that never hold indexable source, at any depth: VCS
+# metadata, package manager installs and tool caches
+SKIP_DIRS = {
+    '.git', '.hg', '.svn',
+    'node_modules', 'bower_components',
+    '.venv', '__pycache__', '.tox', '.nox',
+    '.mypy_cache', '.pytest_cache', '.ruff_cache',
+    '.idea', '.vscode',
+}
+
+# Vendored code, virtualenvs and build output, skipped only at the repository
+# root: deeper down these names are often real packages (src/build/,
+# pkg/target/). Nested vendored or generated trees are left to .gitignore and
+# .gitattributes (see file_filter).
+ROOT_SKIP_DIRS = {
+    'vendor', 'third_party', 'venv', 'env',
+    'dist', 'build', 'target', 'bin', 'obj', 'out',
+}
+
+def clone_repository(repo_url, repo_path, modes=None, blob_limit=None):
+    """Clone only what indexing needs
+
+    modes is a set or comma-separated string (default CLONE_MODE, 'shallow'):
+      full     - plain clone with full history
+      shallow  - --depth=1, HEAD only
+      partial  - --filter=blob:limit=<blob_limit> (default CLONE_BLOB_LIMIT, '1m')
+      sparse   - sparse checkout of the extensions the walker indexes
+    Local paths are turned into file:// URLs so depth/filter also apply to
+    local (bare) repositories.
+    """
+    if modes is None:
+        modes = os.getenv('CLONE_MODE', 'shallow')
+    if isinstance(modes, str):
+        modes = {m.strip() for m in modes.split(',') if m.strip()}
+    if blob_limit is None:
+        blob_limit = os.getenv('CLONE_BLOB_LIMIT', '1m')
+
+    options = {}
+    if 'shallow' in modes:
+        options['depth'] = 1
+    if 'partial' in modes:
+        options['filter'] = f'blob:limit={blob_limit}'
+    if 'sparse' in modes:
+        options['sparse'] = True
+    if options and os.path.isdir(repo_url):
+        # git ignores --depth/--filter for plain local path clones
+        repo_url = Path(repo_url).resolve().as_uri()
+
+    with metrics.stage('clone'):
+        repo = Repo.clone_from(repo_url, to_path=repo_path, **options)
+        if 'sparse' in modes:
+            patterns = [f'*{ext}' for ext in sorted(set(LANGUAGE_MAP) | set(TEXT_EXTENSIONS))]
+            # filter_files reads these from the work tree
+            patterns += ['.gitignore', '.gitattributes']
+            repo.git.sparse_checkout('set', '--no-cone', *patterns)
+    return repo
+
+def walk_repo(repo_path, extensions=None):
+    """Walk the repository once, yielding (file_path, ext) for every indexable file"""
+    if extensions is None:
+        extensions = set(LANGUAGE_MAP) | set(TEXT_EXTENSIONS)
+    top = os.path.normpath(repo_path)
+    for root, dirs, files in os.walk(repo_path):
+        # Prune in place so os.walk never descends into skipped directories
+        skip = SKIP_DIRS | ROOT_SKIP_DIRS if os.path.normpath(root) == top else SKIP_DIRS
+        dirs[:] = sorted(d for d in dirs if d not in skip)
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1].lower()
+            if ext in extensions:
+                yield os.path.join(root, name), ext
+
+_parsers = {}
+
+def get_parser(lang):
+    """Return a shared LanguageParser for the given language"""
+    if lang not in _parsers:
+        _parsers[lang] = LanguageParser(language=lang, parser_threshold=0)
+    return _parsers[lang]
+
+# Indexed, but LanguageParser has no segmenter for them ("No parser available")
+UNSEGMENTED_LANGUAGES = {Language.SWIFT, Language.HTML, Language.MARKDOWN}
+
+def load_file(file_path, ext):
+    """Parse a single file into documents using the parser for its extension"""
+    if ext in LANGUAGE_MAP and LANGUAGE_MAP[ext] not in UNSEGMENTED_LANGUAGES:
+        blob = Blob.from_path(file_path)
+        return list(get_parser(LANGUAGE_MAP[ext]).lazy_parse(blob))
+    return TextLoader(file_path, encoding='utf-8').load()
+
+def iter_repo_documents(repo_path, include_text=True):
+    """Yield documents for every supported file in a single pass over the tree"""
+    extensions = set(LANGUAGE_MAP)
+    if include_text:
+        extensions |= set(TEXT_EXTENSIONS)
+    for file_path, ext in walk_repo(repo_path, extensions):
         try:
-            loader = GenericLoader.from_filesystem(
-                repo_path,
-                glob=f'**/*{ext}',
-                suffixes=[ext],
-                parser=LanguageParser(language=lang, parser_threshold=0)
-            )
-            docs = loader.load()
-            all_documents.extend(docs)
+            yield from load_file(file_path, ext)
         except Exception as e:
+            # Skip files that can't be decoded or parsed
             pass
-    
-    return all_documents
+
+def load_repo(repo_path):
+    """Load all code files from repository - supports multiple languages"""
+    return list(iter_repo_documents(repo_path, include_text=False))
+
+# Extensions that get a language-aware splitter; anything else is split generically
+SPLITTER_LANGUAGES = {
+    '.py': Language.PYTHON,
+    '.js': Language.JS,
+    '.jsx': Language.JS,
+    '.ts': Language.JS,
+    '.tsx': Language.JS,
+    '.java': Language.JAVA,
+    '.cpp': Language.CPP,
+    '.c': Language.C,
+    '.h': Language.CPP,
+    '.hpp': Language.CPP,
+    '.go': Language.GO,
+    '.rs': Language.RUST,
+    '.rb': Language.RUBY,
+    '.md': Language.MARKDOWN,
+    '.markdown': Language.MARKDOWN,
+    '.html': Language.HTML,
+    '.htm': Language.HTML,
+}
+
+_splitters = {}
+
+def get_splitter(ext):
+    """Return a shared splitter for the given file extension"""
+    lang = SPLITTER_LANGUAGES.get(ext)
+    if lang not in _splitters:
+        if lang is None:
+            _splitters[lang] = RecursiveCharacterTextSplitter(
+                chunk_size=2000, chunk_overlap=200
+            )
+        else:
+            _splitters[lang] = RecursiveCharacterTextSplitter.from_language(
+                language=lang, chunk_size=2000, chunk_overlap=200
+            )
+    return _splitters[lang]
+
+def split_document(doc):
+    """Split a single document with the splitter for its file type"""
+    try:
+        source = doc.metadata.get('source', '')
+        ext = os.path.splitext(source)[1].lower()
+        return get_splitter(ext).split_documents([doc])
+    except:
+        # Fallback to generic splitter
+        return get_splitter(None).split_documents([doc])
 
 def text_splitter(documents):
     """Split documents intelligently based on content type"""
     all_chunks = []
-    
     for doc in documents:
-        try:
-            source = doc.metadata.get('source', '')
-            ext = os.path.splitext(source)[1].lower()
-            
-            # Choose appropriate splitter
-            if ext in ['.py']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.PYTHON, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.js', '.jsx', '.ts', '.tsx']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.JS, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.java']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.JAVA, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.cpp', '.c', '.h', '.hpp']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.CPP, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.go']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.GO, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.rs']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.RUST, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.md', '.markdown']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.MARKDOWN, chunk_size=2000, chunk_overlap=200
-                )
-            else:
-                splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=2000, chunk_overlap=200
-                )
-            
-            chunks = splitter.split_documents([doc])
-            all_chunks.extend(chunks)
-        except:
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=2000, chunk_overlap=200
-            )
-            chunks = splitter.split_documents([doc])
-            all_chunks.extend(chunks)
-    
+        all_chunks.extend(split_document(doc))
     return all_chunks
 
+def parse_and_split_file(file_entry, with_symbols=False):
+    """Parse and chunk one (file_path, ext) entry; runs inside pool workers
+
+    Returns (document_count, chunks, symbols); symbols is empty unless
+    with_symbols is set.
+    """
+    file_path, ext = file_entry
+    try:
+        with metrics.stage('load', files=1) as s:
+            docs = load_file(file_path, ext)
+            s.count(documents=len(docs))
+    except Exception as e:
+        return 0, [], []
+    symbols = []
+    if with_symbols and docs:
+        with open(file_path, encoding='utf-8', errors='ignore') as f:
+            symbols = extract_symbols(file_path, f.read(), ext)
+    with metrics.stage('split', documents=len(docs)) as s:
+        chunks = text_splitter(docs)
+        s.count(chunks=len(chunks))
+    return len(docs), chunks, symbols
+
+def parse_in_worker(file_entry, with_symbols=False):
+    """parse_and_split_file for pool workers
+
+    Returns (result, samples): the worker's load/split timings travel back
+    with the chunks so the parent can replay them into its own metrics.
+    """
+    with metrics.capture() as samples:
+        result = parse_and_split_file(file_entry, with_symbols)
+    return result, samples
+
+def replay_worker_result(outcome):
+    """Unwrap a parse_in_worker result, recording its timings in this process"""
+    result, samples = outcome
+    metrics.replay(samples)
+    return result
+
+def get_ingest_workers(workers=None):
+    """Resolve the worker count from the argument or INGEST_WORKERS (default 1)"""
+    if workers is None:
+        workers = int(os.getenv('INGEST_WORKERS', '1'))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def is_indexable(rel_path, extensions):
+    """Check a repo-relative path against the walker's extension and skip rules"""
+    parts = rel_path.replace('\\', '/').split('/')
+    if any(part in SKIP_DIRS for part in parts[:-1]):
+        return False
+    if len(parts) > 1 and parts[0] in ROOT_SKIP_DIRS:
+        return False
+    return os.path.splitext(parts[-1])[1].lower() in extensions
+
+def index_entries(repo_path, include_text=True, paths=None, filter_report=None):
+    """The (file_path, ext) entries to index, and the file filter's duplicate_files map
+
+    Walks the repository, or takes only paths (repo-relative, '/'-separated)
+    when given. Unless FILE_FILTER=0 the entries go through filter_files,
+    whose report is merged into filter_report when a dict is passed.
+    """
+    extensions = set(LANGUAGE_MAP)
+    if include_text:
+        extensions |= set(TEXT_EXTENSIONS)
+    if paths is None:
+        entries = list(walk_repo(repo_path, extensions))
+    else:
+        entries = [
+            (source_path(repo_path, p), os.path.splitext(p)[1].lower())
+            for p in sorted(paths) if is_indexable(p, extensions)
+        ]
+    duplicate_files = {}
+    if os.getenv('FILE_FILTER', '1') != '0':
+        entries, report = filter_files(repo_path, entries)
+        duplicate_files = report.pop('duplicate_files')
+        if filter_report is not None:
+            filter_report.update(report)
+    return entries, duplicate_files
+
+def load_and_split(repo_path, workers=None, include_text=True, paths=None, symbols=None, filter_report=None,
+                   collapsed=None):
+    """Parse and chunk a repository, optionally across a process pool
+
+    Returns (document_count, chunks). Chunks always come back in walk order,
+    whatever the worker count, so the resulting index is reproducible.
+    workers=1 runs in-process; workers<=0 uses every CPU. When paths is given
+    (repo-relative, '/'-separated) only those files are processed. If a
+    symbols list is passed, the definitions found in each file are appended
+    to it.
+
+    Ignored, vendored, generated, minified, oversized and duplicate files
+    are dropped before parsing unless FILE_FILTER=0, and near-identical
+    chunks are collapsed into one unless NEAR_DUP_DEDUP=0. Pass a
+    filter_report dict to receive the counts (see file_filter.filter_files;
+    the chunk reduction is under 'near_duplicates'), and a collapsed list
+    to receive the dropped near-duplicates (for the BM25 index).
+    """
+    entries, duplicate_files = index_entries(repo_path, include_text, paths, filter_report)
+    workers = min(get_ingest_workers(workers), max(len(entries), 1))
+
+    document_count = 0
+    all_chunks = []
+    for doc_count, chunks, file_symbols in iter_parsed_files(entries, workers, symbols is not None):
+        document_count += doc_count
+        mark_duplicate_files(chunks, duplicate_files)
+        all_chunks.extend(chunks)
+        if symbols is not None:
+            symbols.extend(file_symbols)
+    if os.getenv('NEAR_DUP_DEDUP', '1') != '0':
+        all_chunks, dedup_report = collapse_near_duplicates(all_chunks, collapsed=collapsed)
+        if filter_report is not None:
+            filter_report['near_duplicates'] = dedup_report
+    return document_count, all_chunks
+
+def mark_duplicate_files(chunks, duplicate_files):
+    """Record the byte-identical copies skipped by the file filter on the kept file's chunks
+
+    Stored newline-separated under 'duplicate_files', so an incremental
+    re-index can bring the copies back when the kept file changes.
+    """
+    for chunk in chunks:
+        copies = duplicate_files.get(chunk.metadata.get('source'))
+        if copies:
+            chunk.metadata['duplicate_files'] = '\n'.join(copies)
+
+def index_chunks(text_chunks, persist_directory, embeddings, batch_size=256):
+    """Embed and store chunks in the project's vector store in batches
+
+    Equivalent to Chroma.from_documents; the BM25 index and the
+    near-duplicate reverse index are written too.
+    """
+    timed = TimedEmbeddings(embeddings)
+    vectordb = open_vectorstore(persist_directory, timed)
+    lexical = open_lexical_index(persist_directory)
+    duplicate_index = open_duplicate_index(persist_directory)
+    for start in range(0, len(text_chunks), batch_size):
+        batch = text_chunks[start:start + batch_size]
+        ids = [str(uuid.uuid4()) for _ in batch]
+        upsert_batch(vectordb, lexical, batch, timed, ids=ids)
+        record_duplicates(duplicate_index, ids, batch)
+    # The timing wrapper is for ingestion only; queries get the plain embedder
+    return open_vectorstore(persist_directory, embeddings)
+
+def record_duplicates(duplicate_index, ids, docs):
+    """Add the 'duplicate_sources' of stored chunks to the reverse index"""
+    duplicate_index.add([
+        (source, chunk_id) for chunk_id, doc in zip(ids, docs)
+        for source in doc.metadata.get('duplicate_sources', '').split('\n') if source
+    ])
+
+def upsert_batch(vectordb, lexical, docs, timed, ids=None):
+    """Write docs to the vector store and BM25 index
+
+    The vector store embeds through timed (a TimedEmbeddings), which records
+    the 'embed' stage; what remains is recorded as 'upsert'.
+    """
+    start = time.perf_counter()
+    embedded = timed.seconds
+    vectordb.add_documents(docs, ids=ids)
+    lexical.add_documents(docs)
+    metrics.observe('upsert', time.perf_counter() - start - (timed.seconds - embedded), chunks=len(docs))
+
+def current_rss_mb():
+    """Resident memory of this process in MB, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def iter_parsed_files(entries, workers, with_symbols=False, window=None):
+    """Yield parse_and_split_file results in walk order, lazily
+
+    With a pool, at most window() files are in flight, so parsed chunks
+    never pile up faster than the consumer embeds them.
+    """
+    if workers == 1:
+        for entry in entries:
+            yield parse_and_split_file(entry, with_symbols)
+        return
+    worker = partial(parse_in_worker, with_symbols=with_symbols)
+    from concurrent.futures import ProcessPoolExecutor
+    if window is None:
+        window = lambda: workers * 2
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for entry in entries:
+            pending.append(pool.submit(worker, entry))
+            while len(pending) >= window():
+                yield replay_worker_result(pending.popleft().result())
+        while pending:
+            yield replay_worker_result(pending.popleft().result())
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def stream_index(repo_path, persist_directory, embeddings, workers=None, include_text=True,
+                 batch_size=256, memory_mb=None, progress=None, with_symbols=True, project_name=None):
+    """Walk, parse, split, embed and upsert a repository in bounded batches
+
+    Unlike load_and_split + index_chunks, the repository's chunks are never
+    all in memory: each batch is written to the vector store, BM25 index
+    and symbol table (and the shared index for project_name when
+    CROSS_PROJECT_SEARCH is on) before more files are parsed. Collapsed
+    near-duplicate chunks get no vector but still go to the BM25 index, so
+    identifiers only they contain stay searchable. The batch
+    closes at batch_size chunks or a quarter of the memory ceiling in chunk
+    text. The ceiling is memory_mb (default INGEST_MEMORY_MB, 1024) of
+    growth over the process's resident memory when the ingest starts, so
+    the embedding model and other stores already loaded do not count. While
+    over it, batches are flushed early and only one file is parsed at a time.
+
+    progress(stage, **fields) is called after each batch (job.report fits).
+    Returns (vectordb, stats); stats has the file filter report plus
+    documents, chunks, near_duplicates, peak_rss_mb, embed_seconds and
+    embed_chunks_per_sec (time and throughput of the model alone) and
+    embed_cache_hits (chunks served from the embedding cache).
+    """
+    if memory_mb is None:
+        memory_mb = int(os.getenv('INGEST_MEMORY_MB', '1024'))
+    stats = {'documents': 0, 'chunks': 0}
+    entries, duplicate_files = index_entries(repo_path, include_text, filter_report=stats)
+    workers = min(get_ingest_workers(workers), max(len(entries), 1))
+
+    timed = TimedEmbeddings(embeddings)
+    stores = [(open_vectorstore(persist_directory, timed), open_lexical_index(persist_directory),
+               open_duplicate_index(persist_directory), None)]
+    if project_name and cross_project_enabled():
+        directory = shared_index_directory()
+        stores.append((open_vectorstore(directory, timed), open_lexical_index(directory),
+                       open_duplicate_index(directory), project_name))
+    symbol_index = open_symbol_index(persist_directory) if with_symbols else None
+    dedup = NearDuplicateIndex() if os.getenv('NEAR_DUP_DEDUP', '1') != '0' else None
+    # Representative chunk id -> sources of the chunks collapsed into it; one
+    # path per collapsed chunk, so it grows with the duplicates, never their text
+    duplicates = {}
+
+    max_buffer_bytes = memory_mb * 1024 * 1024 // 4
+    batch, batch_ids, batch_symbols, batch_collapsed = [], [], [], []
+    batch_bytes = 0
+    chunks_seen = 0
+    files_done = 0
+    baseline = peak = current_rss_mb() or 0.0
+
+    def over_ceiling():
+        rss = current_rss_mb()
+        return rss is not None and rss - baseline > memory_mb
+
+    def window():
+        # Backpressure: a single file in flight while over the ceiling
+        return 1 if over_ceiling() else workers * 2
+
+    def tagged(chunks, project):
+        if project is None:
+            return chunks
+        return [Document(page_content=c.page_content, metadata={**c.metadata, 'project': project}) for c in chunks]
+
+    def flush():
+        nonlocal batch, batch_ids, batch_symbols, batch_collapsed, batch_bytes
+        for vectordb, lexical, _, project in stores:
+            if batch:
+                upsert_batch(vectordb, lexical, tagged(batch, project), timed, ids=batch_ids)
+            if batch_collapsed:
+                lexical.add_documents(tagged(batch_collapsed, project))
+        if symbol_index is not None and batch_symbols:
+            symbol_index.add_symbols(batch_symbols)
+        stats['chunks'] += len(batch)
+        batch, batch_ids, batch_symbols, batch_collapsed, batch_bytes = [], [], [], [], 0
+        if progress:
+            progress('embedding', files=files_done, total_files=len(entries),
+                     chunks=chunks_seen, embedded=stats['chunks'], chunks_per_sec=timed.chunks_per_sec())
+
+    for doc_count, chunks, file_symbols in iter_parsed_files(entries, workers, with_symbols, window):
+        files_done += 1
+        stats['documents'] += doc_count
+        mark_duplicate_files(chunks, duplicate_files)
+        batch_symbols.extend(file_symbols)
+        for chunk in chunks:
+            chunks_seen += 1
+            chunk_id = str(uuid.uuid4())
+            representative = dedup.add(chunk_id, chunk.page_content) if dedup else None
+            if representative is not None:
+                duplicates.setdefault(representative, []).append(chunk.metadata.get('source', ''))
+                batch_collapsed.append(chunk)
+                batch_bytes += len(chunk.page_content)
+                continue
+            batch.append(chunk)
+            batch_ids.append(chunk_id)
+            batch_bytes += len(chunk.page_content)
+        if len(batch) >= batch_size or batch_bytes >= max_buffer_bytes or over_ceiling():
+            flush()
+        peak = max(peak, current_rss_mb() or 0.0)
+    flush()
+
+    # Representatives may already be stored when later copies turn up; record them now
+    ids = list(duplicates)
+    for start in range(0, len(ids), batch_size):
+        for vectordb, _, duplicate_index, project in stores:
+            stored = vectordb.get(ids=ids[start:start + batch_size], include=['documents', 'metadatas'])
+            docs = []
+            for chunk_id, content, metadata in zip(stored['ids'], stored['documents'], stored['metadatas']):
+                doc = Document(page_content=content, metadata=metadata or {})
+                mark_duplicates(doc, duplicates[chunk_id])
+                docs.append(doc)
+            if docs:
+                vectordb.update_documents(ids=stored['ids'], documents=docs)
+                record_duplicates(duplicate_index, stored['ids'], docs)
+
+    stats['near_duplicates'] = reduction_report(chunks_seen, stats['chunks'])
+    stats['peak_rss_mb'] = round(peak, 1)
+    stats['embed_seconds'] = round(timed.model_seconds, 2)
+    stats['embed_chunks_per_sec'] = timed.chunks_per_sec()
+    stats['embed_cache_hits'] = timed.chunks - timed.model_chunks
+    # The timing wrapper is for ingestion only; queries get the plain embedder
+    return open_vectorstore(persist_directory, embeddings), stats
+
+def open_vectorstore(persist_directory, embeddings):
+    """Open the vector store in persist_directory
+
+    A directory keeps the format it was created with. New stores use Chroma
+    (float32) unless VECTOR_STORE is 'int8' or 'float16', which selects the
+    compact QuantizedVectorStore.
+    """
+    if os.path.exists(os.path.join(persist_directory, 'vectors.sqlite3')):
+        return QuantizedVectorStore(persist_directory, embeddings)
+    mode = os.getenv('VECTOR_STORE', 'chroma')
+    if mode != 'chroma' and not os.path.exists(os.path.join(persist_directory, 'chroma.sqlite3')):
+        return QuantizedVectorStore(persist_directory, embeddings, dtype=mode)
+    return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+
+def open_lexical_index(persist_directory):
+    """BM25 index stored alongside the Chroma files of a vector store"""
+    os.makedirs(persist_directory, exist_ok=True)
+    return LexicalIndex(os.path.join(persist_directory, 'lexical.sqlite3'))
+
+def open_symbol_index(persist_directory):
+    """Symbol table stored alongside the Chroma files of a vector store"""
+    os.makedirs(persist_directory, exist_ok=True)
+    return SymbolIndex(os.path.join(persist_directory, 'symbols.sqlite3'))
+
+def open_duplicate_index(persist_directory):
+    """Reverse index of near-duplicate sources stored alongside a vector store"""
+    os.makedirs(persist_directory, exist_ok=True)
+    return DuplicateIndex(os.path.join(persist_directory, 'duplicates.sqlite3'))
+
+def clear_index(persist_directory, embeddings):
+    """Empty the vectors, BM25 index, symbol table and duplicate index of a store before re-indexing it"""
+    if os.path.isdir(persist_directory):
+        open_vectorstore(persist_directory, embeddings).delete_collection()
+    open_lexical_index(persist_directory).clear()
+    open_symbol_index(persist_directory).clear()
+    open_duplicate_index(persist_directory).clear()
+
+def build_retriever(vectordb, persist_directory, k=8, projects=None):
+    """Retriever for the QA chain
+
+    MMR vector search, fused with BM25 hits unless HYBRID_RETRIEVAL=0. With
+    RERANK=1 a wider set of RERANK_CANDIDATES (default 50) is retrieved and
+    cut back to k by a cross-encoder. In front of it all, a symbol lookup
+    answers questions naming a known function or class with its definition
+    (disable with SYMBOL_LOOKUP=0).
+
+    projects restricts a shared cross-project index to those projects; both
+    searches filter on the chunks' 'project' metadata, so the whole set is
+    answered in one query. The symbol lookup is per project and is skipped.
+    """
+    rerank = os.getenv('RERANK', '0') == '1'
+    candidates = int(os.getenv('RERANK_CANDIDATES', '50')) if rerank else k
+    where = {'project': {'$in': list(projects)}} if projects else None
+    search_kwargs = {'k': candidates, 'fetch_k': max(20, candidates * 2)}
+    if where:
+        search_kwargs['filter'] = where
+    retriever = vectordb.as_retriever(search_type='mmr', search_kwargs=search_kwargs)
+    if os.getenv('HYBRID_RETRIEVAL', '1') != '0':
+        retriever = HybridRetriever(
+            vector_retriever=retriever,
+            lexical_index=open_lexical_index(persist_directory),
+            k=candidates,
+            lexical_k=max(20, candidates),
+            where=where
+        )
+    if rerank:
+        retriever = RerankingRetriever(base_retriever=retriever, reranker=get_reranker(), k=k)
+    if os.getenv('SYMBOL_LOOKUP', '1') != '0' and not projects:
+        retriever = SymbolRetriever(
+            symbol_index=open_symbol_index(persist_directory),
+            fallback=retriever,
+            k=k
+        )
+    return retriever
+
+def build_messages(retriever, prompt, question):
+    """Retrieve context for question and format the prompt, timing both stages
+
+    Returns (docs, messages, stages); stages are the finished metrics.Stage
+    handles, whose .ms give the per-request breakdown.
+    """
+    with metrics.stage('retrieve') as retrieve:
+        docs = retriever.invoke(question)
+        retrieve.count(chunks=len(docs))
+        annotate(chunk_ids=[chunk_id(doc) for doc in docs],
+                 sources=[doc.metadata.get('source', '') for doc in docs])
+    with metrics.stage('prompt') as format_prompt:
+        # Merges overlapping chunks and fits them into CONTEXT_TOKEN_BUDGET
+        messages = prompt.invoke({"context": assemble_context(docs), "question": question})
+        format_prompt.count(tokens=count_tokens(messages.to_string()))
+    return docs, messages, [retrieve, format_prompt]
+
+def chunk_id(doc):
+    """Vector store id of a retrieved chunk, or its content key for BM25/symbol hits"""
+    return doc.id or chunk_key(doc.metadata.get('source', ''), doc.page_content)
+
+def stream_generation(model, messages, stages=None):
+    """Yield the model's answer text as it is generated, recording the 'generate' stage
+
+    The stage handle is appended to stages when a list is given.
+    """
+    answer = []
+    with metrics.stage('generate') as generate:
+        if stages is not None:
+            stages.append(generate)
+        for chunk in model.stream(messages):
+            answer.append(chunk.content)
+            yield chunk.content
+        generate.count(tokens=count_tokens(''.join(answer)))
+
+class StagedChain:
+    """retriever | format_docs | prompt | model | StrOutputParser, run stage by stage
+
+    Answers like the equivalent LCEL chain, but each stage is recorded in
+    the process metrics. Pass a timings dict to also get {stage: ms} for
+    this answer once it is complete.
+    """
+
+    def __init__(self, retriever, prompt, model):
+        self.retriever = retriever
+        self.prompt = prompt
+        self.model = model
+
+    def stream(self, question, timings=None):
+        _, messages, stages = build_messages(self.retriever, self.prompt, question)
+        yield from stream_generation(self.model, messages, stages)
+        if timings is not None:
+            timings.update({stage.name: stage.ms for stage in stages})
+
+    def invoke(self, question, timings=None):
+        return ''.join(self.stream(question, timings))
+
+def cross_project_enabled():
+    """Whether projects are also indexed into the shared cross-project index"""
+    return os.getenv('CROSS_PROJECT_SEARCH', '0') == '1'
+
+def shared_index_directory():
+    return os.getenv('SHARED_INDEX_DIR', 'db/.shared')
+
+def add_to_shared_index(project_name, text_chunks, embeddings, collapsed=()):
+    """Copy a project's chunks into the shared index, tagged with a 'project' field
+
+    The vectors come straight from the embedding cache, so this costs
+    storage but no extra model calls. collapsed near-duplicates only go to
+    the shared BM25 index.
+    """
+    def tagged(chunks):
+        return [
+            Document(page_content=chunk.page_content, metadata={**chunk.metadata, 'project': project_name})
+            for chunk in chunks
+        ]
+    if collapsed:
+        open_lexical_index(shared_index_directory()).add_documents(tagged(collapsed))
+    return index_chunks(tagged(text_chunks), shared_index_directory(), embeddings)
+
+def backfill_shared_index(project_name, vectordb, embeddings):
+    """Copy a project indexed before CROSS_PROJECT_SEARCH was enabled into the shared index"""
+    shared = open_vectorstore(shared_index_directory(), embeddings)
+    if shared.get(where={'project': project_name}, limit=1, include=[])['ids']:
+        return False
+    stored = vectordb.get(include=['documents', 'metadatas'])
+    chunks = [
+        Document(page_content=content, metadata=metadata or {})
+        for content, metadata in zip(stored['documents'], stored['metadatas'])
+    ]
+    add_to_shared_index(project_name, chunks, embeddings)
+    return True
+
+def remove_from_shared_index(embeddings, project_name=None, sources=None):
+    """Drop a whole project, or only the given source files, from the shared index"""
+    directory = shared_index_directory()
+    if not os.path.exists(directory) or sources is not None and not sources:
+        return
+    vectordb = open_vectorstore(directory, embeddings)
+    lexical = open_lexical_index(directory)
+    duplicate_index = open_duplicate_index(directory)
+    if sources is not None:
+        drop_sources(vectordb, sources, duplicate_index)
+        lexical.delete_sources(sorted(sources))
+        return
+    stale = vectordb.get(where={'project': project_name}, include=[])
+    if stale['ids']:
+        vectordb.delete(ids=stale['ids'])
+        duplicate_index.delete_ids(stale['ids'])
+    # Collapsed near-duplicates are only in the BM25 index, so its sources are looked up there
+    lexical.delete_sources(lexical.sources({'project': project_name}))
+
+def drop_sources(vectordb, sources, duplicate_index):
+    """Delete the chunks of the given source files, keeping their near-duplicates covered
+
+    A representative chunk stands in for near-identical chunks of the files
+    in its 'duplicate_sources'. When its own file goes but one of those
+    files stays, the chunk is re-attributed to that file instead of being
+    deleted. Dropped files are also struck from every other chunk's list;
+    those chunks are found through duplicate_index (open_duplicate_index),
+    not by reading the whole store.
+    """
+    sources = set(sources)
+    if not sources:
+        return
+    stale = vectordb.get(where={'source': {'$in': sorted(sources)}}, include=['documents', 'metadatas'])
+    stale_ids = set(stale['ids'])
+    listing = [i for i in duplicate_index.representatives(sorted(sources)) if i not in stale_ids]
+    if listing:
+        listed = vectordb.get(ids=listing, include=['documents', 'metadatas'])
+    else:
+        listed = {'ids': [], 'documents': [], 'metadatas': []}
+
+    doomed, ids, docs = [], [], []
+    for result in (stale, listed):
+        for chunk_id, content, metadata in zip(result['ids'], result['documents'], result['metadatas']):
+            metadata = dict(metadata or {})
+            survivors = [s for s in metadata.get('duplicate_sources', '').split('\n') if s and s not in sources]
+            if metadata.get('source') in sources:
+                if not survivors:
+                    doomed.append(chunk_id)
+                    continue
+                metadata['source'] = survivors.pop(0)
+            doc = Document(page_content=content, metadata=metadata)
+            mark_duplicates(doc, survivors)
+            ids.append(chunk_id)
+            docs.append(doc)
+    if doomed:
+        vectordb.delete(ids=doomed)
+    if ids:
+        vectordb.update_documents(ids=ids, documents=docs)
+    duplicate_index.delete_sources(sorted(sources))
+    duplicate_index.delete_ids(doomed + ids)
+    record_duplicates(duplicate_index, ids, docs)
+
+def source_path(repo_path, rel_path):
+    """Build the 'source' metadata value the walker records for a repo-relative git path"""
+    return os.path.join(repo_path, *rel_path.split('/'))
+
+def diff_commits(repo_path, old_sha, new_sha='HEAD'):
+    """Return (removed, updated) repo-relative paths changed between two commits
+
+    removed holds paths whose old vectors must be dropped (deleted, modified
+    or renamed-from); updated holds paths to embed again (added, modified or
+    renamed-to). Raises if old_sha is not in the local history.
+    """
+    repo = Repo(repo_path)
+    old_commit = repo.commit(old_sha)
+    new_commit = repo.commit(new_sha)
+    removed, updated = set(), set()
+    for change in old_commit.diff(new_commit):
+        if change.change_type == 'A':
+            updated.add(change.b_path)
+        elif change.change_type == 'D':
+            removed.add(change.a_path)
+        else:
+            # M, T and R: drop the old path, index the new one
+            removed.add(change.a_path)
+            updated.add(change.b_path)
+    return sorted(removed), sorted(updated)
+
 def load_embedding():
-    embeddings=HuggingFaceEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')
-    return embeddings
+    model_name='sentence-transformers/all-MiniLM-L6-v2'
+    batch_size=int(os.getenv('EMBED_BATCH_SIZE','32'))
+    embeddings=HuggingFaceEmbeddings(
+        model_name=model_name,
+        encode_kwargs={'batch_size':batch_size}
+    )
+    # One model forward pass per length bucket
+    engine=BatchedEmbeddings(embeddings,batch_size=batch_size)
+    # Content-addressed cache: unchanged chunks are never re-embedded
+    return CachedEmbeddings(engine,model_name)
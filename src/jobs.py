@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+class Job:
+    """Handle passed to a running job so it can report per-stage progress"""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.id = job_id
+        self.stage = None
+        self.progress = {}
+        self.last_write = 0.0
+
+    def report(self, stage, **progress):
+        """Record the current stage and counters, e.g. report('parsed', files=120)
+
+        Writes are throttled to one every 0.5s within a stage so per-file
+        callbacks don't hammer SQLite; stage changes are always written.
+        """
+        self.progress.update(progress)
+        now = time.monotonic()
+        if stage == self.stage and now - self.last_write < 0.5:
+            return
+        self.stage = stage
+        self.last_write = now
+        self.queue._update(self.id, stage=stage, progress=json.dumps(self.progress))
+
+class JobQueue:
+    """Background job runner with a persistent job table in SQLite
+
+    At most max_concurrent jobs (default INGEST_CONCURRENCY, 1) run at once;
+    the rest wait in 'queued'. Jobs left queued or running by a previous
+    process are marked failed on startup.
+    """
+
+    def __init__(self, db_path, max_concurrent=None):
+        if max_concurrent is None:
+            max_concurrent = int(os.getenv('INGEST_CONCURRENCY', '1'))
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                created DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by restart', updated = CURRENT_TIMESTAMP "
+            "WHERE status IN ('queued', 'running')"
+        )
+        self.conn.commit()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='ingest')
+
+    def _update(self, job_id, **fields):
+        columns = ', '.join(f'{k} = ?' for k in fields)
+        with self.lock:
+            self.conn.execute(
+                f'UPDATE jobs SET {columns}, updated = CURRENT_TIMESTAMP WHERE id = ?',
+                [*fields.values(), job_id]
+            )
+            self.conn.commit()
+
+    def submit(self, name, func, *args, **kwargs):
+        """Queue func(job, *args, **kwargs); its return value is stored as the JSON result"""
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, name, status, progress) VALUES (?, ?, 'queued', '{}')",
+                (job_id, name)
+            )
+            self.conn.commit()
+        self.executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        job = Job(self, job_id)
+        self._update(job_id, status='running')
+        try:
+            result = func(job, *args, **kwargs)
+            self._update(job_id, status='done', progress=json.dumps(job.progress),
+                         result=json.dumps(result))
+        except Exception as e:
+            print(traceback.format_exc())
+            self._update(job_id, status='failed', progress=json.dumps(job.progress), error=str(e))
+
+    def _row_to_dict(self, row):
+        keys = ['id', 'name', 'status', 'stage', 'progress', 'result', 'error', 'created', 'updated']
+        job = dict(zip(keys, row))
+        job['progress'] = json.loads(job['progress']) if job['progress'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT id, name, status, stage, progress, result, error, created, updated FROM jobs WHERE id = ?',
+                (job_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, limit=20):
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT id, name, status, stage, progress, result, error, created, updated '
+                'FROM jobs ORDER BY created DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
@@ -0,0 +1,216 @@
+import re
+import math
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.tracing import span, annotate
+
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+CAMEL_PART = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+# Question words that only add noise to a code search
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'be', 'of', 'in', 'on', 'to', 'for',
+    'and', 'or', 'what', 'where', 'which', 'who', 'how', 'why', 'when', 'does',
+    'do', 'did', 'this', 'that', 'it', 'its', 'i', 'me', 'my', 'can', 'you',
+    'defined', 'explain', 'show', 'find',
+}
+
+def tokenize_code(text):
+    """Split text into lowercase search terms
+
+    Every identifier is kept whole and also split on snake_case and camelCase
+    boundaries, so handle_remove_readonly matches both itself and 'readonly'.
+    """
+    terms = []
+    for token in IDENTIFIER.findall(text):
+        lower = token.lower()
+        terms.append(lower)
+        parts = [p.lower() for piece in token.split('_') for p in CAMEL_PART.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p != lower)
+    return terms
+
+def chunk_key(source, content):
+    """Identity shared by lexical and vector hits, used when fusing results"""
+    return hashlib.sha1(f"{source}\0{content}".encode('utf-8')).hexdigest()
+
+FIELD = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def metadata_filter(where, column='d.metadata'):
+    """SQL ' AND ...' clause and params for a Chroma-style where on JSON metadata"""
+    clauses, params = [], []
+    for key, value in (where or {}).items():
+        if not FIELD.match(key):
+            raise ValueError(f"Invalid metadata field {key!r}")
+        values = value['$in'] if isinstance(value, dict) else [value]
+        clauses.append(f"json_extract({column}, '$.{key}') IN ({','.join('?' * len(values))})")
+        params.extend(values)
+    return ''.join(' AND ' + clause for clause in clauses), params
+
+class LexicalIndex:
+    """Persistent BM25 inverted index over code chunks, stored in SQLite
+
+    Kept next to a project's Chroma store and updated alongside it, by
+    source file, so incremental re-indexing stays in sync.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_docs_source ON docs (source);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        ''')
+        self.conn.commit()
+        self._stats = None
+
+    def _collection_stats(self):
+        if self._stats is None:
+            count, avg_length = self.conn.execute('SELECT COUNT(*), AVG(length) FROM docs').fetchone()
+            self._stats = (count, avg_length or 0.0)
+        return self._stats
+
+    def add_documents(self, documents):
+        with self.lock:
+            for doc in documents:
+                terms = Counter(tokenize_code(doc.page_content))
+                metadata = {k: v for k, v in doc.metadata.items() if isinstance(v, (str, int, float, bool))}
+                cursor = self.conn.execute(
+                    'INSERT INTO docs (source, length, content, metadata) VALUES (?, ?, ?, ?)',
+                    (doc.metadata.get('source', ''), sum(terms.values()), doc.page_content, json.dumps(metadata))
+                )
+                doc_id = cursor.lastrowid
+                self.conn.executemany(
+                    'INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)',
+                    [(term, doc_id, tf) for term, tf in terms.items()]
+                )
+                self.conn.executemany(
+                    'INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1',
+                    [(term,) for term in terms]
+                )
+            self.conn.commit()
+            self._stats = None
+
+    def delete_sources(self, sources):
+        """Remove every chunk that came from the given source paths"""
+        with self.lock:
+            for source in sources:
+                doc_ids = [row[0] for row in self.conn.execute('SELECT doc_id FROM docs WHERE source = ?', (source,))]
+                for doc_id in doc_ids:
+                    terms = [row[0] for row in self.conn.execute('SELECT term FROM postings WHERE doc_id = ?', (doc_id,))]
+                    self.conn.executemany('UPDATE terms SET df = df - 1 WHERE term = ?', [(t,) for t in terms])
+                    self.conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+                self.conn.execute('DELETE FROM docs WHERE source = ?', (source,))
+            self.conn.execute('DELETE FROM terms WHERE df <= 0')
+            self.conn.commit()
+            self._stats = None
+
+    def sources(self, where=None):
+        """Distinct source paths of the chunks matching a Chroma-style where"""
+        filters, params = metadata_filter(where, column='metadata')
+        with self.lock:
+            return [row[0] for row in self.conn.execute(f'SELECT DISTINCT source FROM docs WHERE 1 = 1{filters}', params)]
+
+    def clear(self):
+        with self.lock:
+            self.conn.executescript('DELETE FROM docs; DELETE FROM postings; DELETE FROM terms;')
+            self.conn.commit()
+            self._stats = None
+
+    def search(self, query, k=8, where=None):
+        """Return up to k (Document, bm25 score) pairs, best first
+
+        where filters on chunk metadata, Chroma style:
+        {'project': 'name'} or {'project': {'$in': [...]}}.
+        """
+        query_terms = [t for t in dict.fromkeys(tokenize_code(query)) if t not in STOPWORDS]
+        if not query_terms:
+            return []
+        with self.lock:
+            count, avg_length = self._collection_stats()
+            if not count:
+                return []
+            marks = ','.join('?' * len(query_terms))
+            df = dict(self.conn.execute(f'SELECT term, df FROM terms WHERE term IN ({marks})', query_terms))
+            # Terms in more than half the chunks carry almost no signal but cost the most to score
+            selective = [t for t in df if df[t] <= count / 2] or list(df)
+            if not selective:
+                return []
+            marks = ','.join('?' * len(selective))
+            filters, params = metadata_filter(where)
+            rows = self.conn.execute(
+                f'SELECT p.term, p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.doc_id = p.doc_id '
+                f'WHERE p.term IN ({marks}){filters}',
+                selective + params
+            ).fetchall()
+
+            scores = Counter()
+            for term, doc_id, tf, length in rows:
+                idf = math.log(1 + (count - df[term] + 0.5) / (df[term] + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+            top = scores.most_common(k)
+            if not top:
+                return []
+            marks = ','.join('?' * len(top))
+            docs = {
+                row[0]: Document(page_content=row[1], metadata=json.loads(row[2]))
+                for row in self.conn.execute(
+                    f'SELECT doc_id, content, metadata FROM docs WHERE doc_id IN ({marks})',
+                    [doc_id for doc_id, _ in top]
+                )
+            }
+        return [(docs[doc_id], score) for doc_id, score in top]
+
+class HybridRetriever(BaseRetriever):
+    """Fuse vector retriever results with BM25 hits using reciprocal rank fusion"""
+
+    vector_retriever: Any
+    lexical_index: Any
+    k: int = 8
+    lexical_k: int = 20
+    rrf_k: int = 60
+    where: Any = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        with span('vector_search'):
+            vector_hits = self.vector_retriever.invoke(query)
+            annotate(hits=len(vector_hits))
+        with span('bm25_search'):
+            lexical_hits = [doc for doc, _ in self.lexical_index.search(query, self.lexical_k, where=self.where)]
+            annotate(hits=len(lexical_hits))
+        ranked = [vector_hits, lexical_hits]
+        scores = Counter()
+        docs = {}
+        for results in ranked:
+            for rank, doc in enumerate(results):
+                key = chunk_key(doc.metadata.get('source', ''), doc.page_content)
+                scores[key] += 1.0 / (self.rrf_k + rank + 1)
+                docs.setdefault(key, doc)
+        return [docs[key] for key, _ in scores.most_common(self.k)]
@@ -0,0 +1,216 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import List
+from langchain_core.embeddings import Embeddings
+from src.tracing import span
+
+PREFIX = 'repo_analysis_stage'
+# Histogram buckets in seconds: sub-millisecond prompt formatting up to multi-minute clones
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# Pipeline order, used to sort the snapshot; other stage names sort last
+STAGES = ('clone', 'load', 'split', 'embed', 'upsert', 'retrieve', 'prompt', 'generate')
+
+class Stage:
+    """Handle yielded by Metrics.stage(); add counts while the stage runs"""
+
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = dict(counts)
+        self.ms = None
+
+    def count(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+class Metrics:
+    """Process-wide durations and counts per pipeline stage
+
+    Stages are clone, load, split, embed, upsert (ingestion) and retrieve,
+    prompt, generate (chat turns). Each keeps a duration histogram, the
+    last 512 durations for percentiles, an error count and running totals
+    of whatever it counts (chunks, tokens, files...). render() gives the
+    Prometheus text format; snapshot() a table for the UI.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def _entry(self, name):
+        if name not in self.stages:
+            self.stages[name] = {
+                'count': 0, 'sum': 0.0, 'errors': 0,
+                'buckets': [0] * len(self.buckets),
+                'recent': deque(maxlen=512),
+                'counts': {},
+            }
+        return self.stages[name]
+
+    def observe(self, name, seconds, error=False, **counts):
+        captured = getattr(self.local, 'captured', None)
+        if captured is not None:
+            captured.append((name, seconds, error, counts))
+            return
+        with self.lock:
+            entry = self._entry(name)
+            entry['count'] += 1
+            entry['sum'] += seconds
+            entry['errors'] += bool(error)
+            entry['recent'].append(seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+            for key, value in counts.items():
+                entry['counts'][key] = entry['counts'].get(key, 0) + value
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """Time the block as one run of stage name, e.g.
+
+            with metrics.stage('split') as s:
+                chunks = split(docs)
+                s.count(chunks=len(chunks))
+
+        s.ms holds the duration once the block exits. Exceptions are
+        counted as errors and re-raised. Inside a request trace the block is
+        also a span, carrying the counts.
+        """
+        handle = Stage(name, counts)
+        start = time.perf_counter()
+        error = False
+        with span(name) as traced:
+            try:
+                yield handle
+            except BaseException:
+                error = True
+                raise
+            finally:
+                seconds = time.perf_counter() - start
+                handle.ms = seconds * 1000
+                self.observe(name, seconds, error, **handle.counts)
+                if traced is not None:
+                    traced.attrs.update(handle.counts)
+
+    @contextmanager
+    def capture(self):
+        """Collect this thread's observations in a list instead of recording them
+
+        Used in pool workers, whose registry dies with the process: the list
+        is sent back and replayed into the parent's registry with replay().
+        """
+        samples = []
+        self.local.captured = samples
+        try:
+            yield samples
+        finally:
+            self.local.captured = None
+
+    def replay(self, samples):
+        for name, seconds, error, counts in samples:
+            self.observe(name, seconds, error, **counts)
+
+    def snapshot(self):
+        """One row per stage: calls, errors, total/mean/p50/p95/max ms and counts"""
+        rows = []
+        with self.lock:
+            order = sorted(self.stages, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES))
+            for name in order:
+                entry = self.stages[name]
+                recent = sorted(entry['recent'])
+
+                def pick(pct):
+                    return round(recent[min(len(recent) - 1, int(pct / 100 * len(recent)))] * 1000, 1)
+                rows.append({
+                    'stage': name,
+                    'calls': entry['count'],
+                    'errors': entry['errors'],
+                    'total_s': round(entry['sum'], 3),
+                    'mean_ms': round(entry['sum'] / entry['count'] * 1000, 1),
+                    'p50_ms': pick(50),
+                    'p95_ms': pick(95),
+                    'max_ms': round(recent[-1] * 1000, 1),
+                    **entry['counts'],
+                })
+        return rows
+
+    def render(self):
+        """All stages in the Prometheus text exposition format"""
+        with self.lock:
+            stages = sorted(self.stages.items())
+            lines = [
+                f'# HELP {PREFIX}_seconds Time spent per pipeline stage',
+                f'# TYPE {PREFIX}_seconds histogram',
+            ]
+            for name, entry in stages:
+                for bound, observed in zip(self.buckets, entry['buckets']):
+                    lines.append(f'{PREFIX}_seconds_bucket{{stage="{name}",le="{bound}"}} {observed}')
+                lines.append(f'{PREFIX}_seconds_bucket{{stage="{name}",le="+Inf"}} {entry["count"]}')
+                lines.append(f'{PREFIX}_seconds_sum{{stage="{name}"}} {entry["sum"]:.6f}')
+                lines.append(f'{PREFIX}_seconds_count{{stage="{name}"}} {entry["count"]}')
+            lines += [
+                f'# HELP {PREFIX}_errors_total Stage runs that raised',
+                f'# TYPE {PREFIX}_errors_total counter',
+            ]
+            lines += [f'{PREFIX}_errors_total{{stage="{name}"}} {entry["errors"]}' for name, entry in stages]
+            kinds = sorted({kind for _, entry in stages for kind in entry['counts']})
+            for kind in kinds:
+                lines += [
+                    f'# HELP {PREFIX}_{kind}_total {kind.capitalize()} processed per pipeline stage',
+                    f'# TYPE {PREFIX}_{kind}_total counter',
+                ]
+                lines += [f'{PREFIX}_{kind}_total{{stage="{name}"}} {entry["counts"][kind]}'
+                          for name, entry in stages if kind in entry['counts']]
+        return '\n'.join(lines) + '\n'
+
+# Shared by everything in the process: the Flask app, Streamlit and the ingest jobs
+metrics = Metrics()
+
+class TimedEmbeddings(Embeddings):
+    """Embeddings wrapper that records embed_documents calls as the 'embed' stage
+
+    Vector stores embed inside add_documents; wrapping the embedder is what
+    separates embedding time from the store write ('upsert'). seconds and
+    chunks accumulate so callers can subtract the time. model_seconds and
+    model_chunks count only what reached the model: when the wrapped
+    embedder is a CachedEmbeddings, cache hits are left out, so
+    chunks_per_sec() is the model's throughput.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.seconds = 0.0
+        self.chunks = 0
+        self.model_seconds = 0.0
+        self.model_chunks = 0
+
+    def chunks_per_sec(self):
+        return round(self.model_chunks / self.model_seconds, 1) if self.model_seconds else 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        model_seconds = getattr(self.embeddings, 'model_seconds', None)
+        misses = getattr(self.embeddings, 'misses', 0)
+        with metrics.stage('embed', chunks=len(texts)) as s:
+            vectors = self.embeddings.embed_documents(texts)
+            if model_seconds is not None:
+                s.count(cache_hits=len(texts) - (self.embeddings.misses - misses))
+        self.seconds += s.ms / 1000
+        self.chunks += len(texts)
+        if model_seconds is None:
+            # No cache in front of the model: every chunk was a model call
+            self.model_seconds += s.ms / 1000
+            self.model_chunks += len(texts)
+        else:
+            self.model_seconds += self.embeddings.model_seconds - model_seconds
+            self.model_chunks += self.embeddings.misses - misses
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
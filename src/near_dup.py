@@ -0,0 +1,172 @@
+import os
+import re
+import zlib
+import sqlite3
+import threading
+import numpy as np
+from collections import defaultdict
+
+WORD = re.compile(r'\w+')
+PRIME = (1 << 31) - 1
+
+class MinHasher:
+    """MinHash signatures over word shingles, with fixed seeds so runs are reproducible"""
+
+    def __init__(self, num_perm=64, shingle_size=5, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, PRIME, size=(num_perm, 1)).astype(np.int64)
+        self.b = rng.randint(0, PRIME, size=(num_perm, 1)).astype(np.int64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def shingles(self, text):
+        words = WORD.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            grams = [' '.join(words)] if words else []
+        else:
+            grams = {' '.join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        return np.array([zlib.crc32(g.encode('utf-8')) % PRIME for g in grams], dtype=np.int64)
+
+    def signature(self, text):
+        """num_perm minimum hash values, or None for text without words"""
+        hashes = self.shingles(text)
+        if not len(hashes):
+            return None
+        return ((self.a * hashes[None, :] + self.b) % PRIME).min(axis=1)
+
+class NearDuplicateIndex:
+    """Incremental LSH index of representative chunks
+
+    add() compares a chunk against the representatives seen so far: it
+    returns the key of a representative it nearly duplicates (estimated
+    Jaccard >= threshold), or registers the chunk as a new representative
+    and returns None. Only representatives' signatures are kept (about 1 KB
+    each with the LSH buckets), and at most max_signatures of them (default
+    NEAR_DUP_MAX_SIGNATURES, 200000): once full, chunks are still matched
+    against the stored representatives but new ones are not registered.
+    """
+
+    def __init__(self, threshold=None, num_perm=64, bands=8, max_signatures=None):
+        if threshold is None:
+            threshold = float(os.getenv('NEAR_DUP_THRESHOLD', '0.85'))
+        if max_signatures is None:
+            max_signatures = int(os.getenv('NEAR_DUP_MAX_SIGNATURES', '200000'))
+        self.threshold = threshold
+        self.max_signatures = max_signatures
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+        self.signatures = {}
+
+    def add(self, key, text):
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        signature = signature.astype(np.uint32)
+        bands = [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+        checked = set()
+        for bucket, band in zip(self.buckets, bands):
+            for other in bucket.get(band, ()):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if np.mean(self.signatures[other] == signature) >= self.threshold:
+                    return other
+        if len(self.signatures) >= self.max_signatures:
+            return None
+        self.signatures[key] = signature
+        for bucket, band in zip(self.buckets, bands):
+            bucket[band].append(key)
+        return None
+
+class DuplicateIndex:
+    """Reverse index of 'duplicate_sources': source file -> representative chunk ids, in SQLite
+
+    Lets an incremental re-index find the chunks that stand in for a
+    changed file without reading every chunk's metadata.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS duplicate_sources (
+                source TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (source, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_duplicate_sources_chunk ON duplicate_sources (chunk_id);
+        ''')
+        self.conn.commit()
+
+    def add(self, pairs):
+        """Record (source, representative chunk id) pairs"""
+        with self.lock:
+            self.conn.executemany('INSERT OR IGNORE INTO duplicate_sources (source, chunk_id) VALUES (?, ?)', pairs)
+            self.conn.commit()
+
+    def representatives(self, sources):
+        """Ids of the chunks that list any of sources as a duplicate"""
+        sources = list(sources)
+        if not sources:
+            return []
+        marks = ','.join('?' * len(sources))
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                f'SELECT DISTINCT chunk_id FROM duplicate_sources WHERE source IN ({marks})', sources
+            )]
+
+    def delete_sources(self, sources):
+        with self.lock:
+            self.conn.executemany('DELETE FROM duplicate_sources WHERE source = ?', [(s,) for s in sources])
+            self.conn.commit()
+
+    def delete_ids(self, ids):
+        with self.lock:
+            self.conn.executemany('DELETE FROM duplicate_sources WHERE chunk_id = ?', [(i,) for i in ids])
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM duplicate_sources')
+            self.conn.commit()
+
+def mark_duplicates(chunk, sources):
+    """Record the other locations of a collapsed chunk in its metadata"""
+    others = list(dict.fromkeys(sources))
+    chunk.metadata['duplicate_sources'] = '\n'.join(others)
+    chunk.metadata['duplicate_count'] = len(sources)
+
+def reduction_report(before, after):
+    return {
+        'chunks_before': before,
+        'chunks_after': after,
+        'reduction': round(1 - after / before, 4) if before else 0.0,
+    }
+
+def collapse_near_duplicates(chunks, threshold=None, collapsed=None):
+    """Keep one chunk per group of near-identical chunks
+
+    Candidate pairs come from LSH over MinHash signatures; a chunk is
+    dropped when its estimated Jaccard similarity to an earlier kept chunk
+    is at least threshold (NEAR_DUP_THRESHOLD, default 0.85). The kept
+    chunk records the other locations in 'duplicate_sources'
+    (newline-separated) and 'duplicate_count'. Dropped chunks are appended
+    to collapsed when a list is passed. Returns (kept_chunks, report).
+    """
+    index = NearDuplicateIndex(threshold)
+    kept = []
+    duplicates = defaultdict(list)
+    for i, chunk in enumerate(chunks):
+        representative = index.add(i, chunk.page_content)
+        if representative is None:
+            kept.append(chunk)
+        else:
+            duplicates[representative].append(chunk.metadata.get('source', ''))
+            if collapsed is not None:
+                collapsed.append(chunk)
+    for i, sources in duplicates.items():
+        mark_duplicates(chunks[i], sources)
+    return kept, reduction_report(len(chunks), len(kept))
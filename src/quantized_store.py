@@ -0,0 +1,293 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from src.lexical_index import metadata_filter
+
+DTYPES = ('int8', 'float16')
+
+def to_int8(vectors):
+    """Symmetric per-vector scaling: v ~= q * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales = np.where(scales == 0, 1, scales).astype(np.float32)
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+def quantize(vectors, dtype):
+    """Unit-normalize float vectors and compress them to int8 or float16
+
+    int8 uses symmetric per-vector scaling: v ~= q * scale. float16 vectors
+    get a scale of 1.0. For int8 the quantization error is also returned as
+    an int8 residual with its own scales, v ~= q * scale + r * residual_scale,
+    close enough to float32 to rank by; float16 error is already far below
+    that, so its residuals are None.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    if dtype == 'float16':
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32), None, None
+    quantized, scales = to_int8(vectors)
+    residuals, residual_scales = to_int8(vectors - quantized.astype(np.float32) * scales[:, None])
+    return quantized, scales, residuals, residual_scales
+
+class QuantizedVectorStore(VectorStore):
+    """Compact vector store: int8 or float16 vectors in one SQLite file
+
+    The search scans every vector, scoring by approximate cosine similarity.
+    It keeps the best candidates (QUANTIZED_RESCORE times the number
+    requested, default 4) and re-scores them; int8 stores add an int8
+    residual of the quantization error to the candidates' vectors first.
+    Residuals stay on disk and are read only for those candidates, so
+    re-scoring needs no model calls and no embedding cache; they add one
+    byte per dimension to an int8 file. float16 stores keep none.
+    Implements the subset of the Chroma API this app uses (add, get by
+    source, delete, MMR retriever).
+    """
+
+    def __init__(self, persist_directory, embedding_function, dtype=None, rescore=None, block_size=4096):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.persist_directory = persist_directory
+        self._embedding_function = embedding_function
+        if rescore is None:
+            rescore = int(os.getenv('QUANTIZED_RESCORE', '4'))
+        self.rescore = rescore
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(persist_directory, 'vectors.sqlite3'), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS vectors (
+                id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                scale REAL NOT NULL,
+                residual BLOB,
+                residual_scale REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_vectors_source ON vectors (source);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        ''')
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(vectors)')}
+        if 'residual' not in columns:
+            # Stores from before residuals; their rows re-score with the quantized vector
+            self.conn.execute('ALTER TABLE vectors ADD COLUMN residual BLOB')
+            self.conn.execute('ALTER TABLE vectors ADD COLUMN residual_scale REAL')
+        # The dtype is fixed when the store is created
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'dtype'").fetchone()
+        if row:
+            dtype = row[0]
+        else:
+            dtype = dtype or 'int8'
+            if dtype not in DTYPES:
+                raise ValueError(f"Unsupported vector dtype {dtype!r}; use one of {DTYPES}")
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('dtype', ?)", (dtype,))
+        self.conn.commit()
+        self.dtype = dtype
+        self._matrix = None
+        self._version = None
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def _load_matrix(self):
+        """(ids, vectors, scales) for the whole store, kept in memory until it changes"""
+        # data_version moves when another connection (e.g. an ingest job) commits
+        version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if self._matrix is None or version != self._version:
+            self._version = version
+            rows = self.conn.execute('SELECT id, vector, scale FROM vectors ORDER BY rowid').fetchall()
+            ids = [row[0] for row in rows]
+            if rows:
+                vectors = np.stack([np.frombuffer(row[1], dtype=self.dtype) for row in rows])
+            else:
+                vectors = np.zeros((0, 0), dtype=self.dtype)
+            scales = np.array([row[2] for row in rows], dtype=np.float32)
+            self._matrix = (ids, vectors, scales)
+        return self._matrix
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors, scales, residuals, residual_scales = quantize(self.embeddings.embed_documents(texts), self.dtype)
+        rows = []
+        for i, text in enumerate(texts):
+            metadata = {k: v for k, v in metadatas[i].items() if isinstance(v, (str, int, float, bool))}
+            rows.append((ids[i], metadata.get('source', ''), text, json.dumps(metadata),
+                         vectors[i].tobytes(), float(scales[i]),
+                         residuals[i].tobytes() if residuals is not None else None,
+                         float(residual_scales[i]) if residuals is not None else None))
+        with self.lock:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO vectors (id, source, content, metadata, vector, scale, residual, residual_scale) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self.conn.commit()
+            self._matrix = None
+        return ids
+
+    def _approximate_top(self, query_vector, n, where=None):
+        """(ids, positions of the n best vectors by approximate score), scanned in blocks
+
+        where restricts the scan to chunks whose metadata matches (Chroma style).
+        """
+        ids, vectors, scales = self._load_matrix()
+        if not ids:
+            return ids, np.array([], dtype=np.int64)
+        scores = np.empty(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), self.block_size):
+            block = vectors[start:start + self.block_size].astype(np.float32)
+            scores[start:start + len(block)] = block @ query_vector * scales[start:start + len(block)]
+        if where:
+            allowed = set(self._where_ids(where))
+            mask = np.fromiter((i in allowed for i in ids), dtype=bool, count=len(ids))
+            scores[~mask] = -np.inf
+            n = min(n, int(mask.sum()))
+            if not n:
+                return ids, np.array([], dtype=np.int64)
+        n = min(n, len(ids))
+        top = np.argpartition(-scores, n - 1)[:n]
+        return ids, top[np.argsort(-scores[top])]
+
+    def _where_clause(self, where):
+        """SQL ' AND ...' clause for a Chroma-style where; source uses its indexed column"""
+        where = dict(where or {})
+        clauses, params = [], []
+        if 'source' in where:
+            value = where.pop('source')
+            values = value['$in'] if isinstance(value, dict) else [value]
+            clauses.append(f" AND source IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        filters, filter_params = metadata_filter(where, column='metadata')
+        return ''.join(clauses) + filters, params + filter_params
+
+    def _where_ids(self, where):
+        clause, params = self._where_clause(where)
+        return [row[0] for row in self.conn.execute(f'SELECT id FROM vectors WHERE 1 = 1{clause}', params)]
+
+    def _fetch(self, ids):
+        marks = ','.join('?' * len(ids))
+        rows = self.conn.execute(
+            f'SELECT id, content, metadata FROM vectors WHERE id IN ({marks})', ids
+        ).fetchall()
+        by_id = {row[0]: Document(page_content=row[1], metadata=json.loads(row[2]), id=row[0]) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def _refine(self, ids, approx):
+        """Add the stored residuals to the dequantized vectors of ids"""
+        marks = ','.join('?' * len(ids))
+        rows = dict((row[0], row[1:]) for row in self.conn.execute(
+            f'SELECT id, residual, residual_scale FROM vectors WHERE id IN ({marks})', ids
+        ))
+        refined = approx.copy()
+        for i, chunk_id in enumerate(ids):
+            residual, residual_scale = rows.get(chunk_id, (None, None))
+            if residual is not None:
+                refined[i] += np.frombuffer(residual, dtype=np.int8).astype(np.float32) * residual_scale
+        return refined
+
+    def _candidates(self, query, n, where=None):
+        """Top candidates with their vectors: [(Document, vector)], best first
+
+        With rescoring, int8 vectors get their stored residuals added;
+        otherwise (and for float16) they are only dequantized.
+        """
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1)
+        with self.lock:
+            ids, top = self._approximate_top(query_vector, n * max(1, self.rescore), where)
+            top_ids = [ids[i] for i in top]
+            docs = self._fetch(top_ids)
+            if not docs:
+                return [], query_vector
+            _, vectors, scales = self._load_matrix()
+            approx = vectors[top].astype(np.float32) * scales[top, None]
+            if not self.rescore:
+                return list(zip(docs, approx)), query_vector
+            exact = self._refine(top_ids, approx) if self.dtype == 'int8' else approx
+        order = np.argsort(-(exact @ query_vector))[:n]
+        return [(docs[i], exact[i]) for i in order], query_vector
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        candidates, query_vector = self._candidates(query, k, filter)
+        return [(doc, float(vector @ query_vector)) for doc, vector in candidates]
+
+    def _similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score(query, k, **kwargs)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        candidates, query_vector = self._candidates(query, fetch_k, filter)
+        if not candidates:
+            return []
+        selected = maximal_marginal_relevance(
+            query_vector, [vector for _, vector in candidates], lambda_mult=lambda_mult, k=k
+        )
+        return [candidates[i][0] for i in selected]
+
+    def get(self, ids=None, where=None, limit=None, include=('documents', 'metadatas'), **kwargs):
+        """Chroma-style get by ids and/or a where filter on metadata"""
+        clause, params = self._where_clause(where)
+        if ids is not None:
+            clause += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        if limit is not None:
+            clause += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT id, content, metadata FROM vectors WHERE 1 = 1{clause}', params
+            ).fetchall()
+        result = {'ids': [row[0] for row in rows]}
+        if 'documents' in include:
+            result['documents'] = [row[1] for row in rows]
+        if 'metadatas' in include:
+            result['metadatas'] = [json.loads(row[2]) for row in rows]
+        return result
+
+    def update_documents(self, ids, documents):
+        """Replace stored chunks in place (same signature as Chroma.update_documents)"""
+        self.add_texts([doc.page_content for doc in documents], [doc.metadata for doc in documents], ids=ids)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return
+        with self.lock:
+            self.conn.executemany('DELETE FROM vectors WHERE id = ?', [(i,) for i in ids])
+            self.conn.commit()
+            self._matrix = None
+
+    def delete_collection(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM vectors')
+            self.conn.commit()
+            self._matrix = None
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM vectors').fetchone()[0]
+
+    def persist(self):
+        """Writes are committed as they happen; kept for parity with Chroma"""
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, persist_directory='db', **kwargs):
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
@@ -0,0 +1,92 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.tracing import span
+
+INITIAL_PAIR_MS = 2.0
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a small local cross-encoder
+
+    All uncached candidates are scored in one batched forward pass. To stay
+    within budget_ms, the number of pairs scored is capped using a running
+    estimate of the per-pair cost; unscored candidates keep their retrieval
+    order behind the scored ones. Scores are cached per (query, chunk).
+    """
+
+    def __init__(self, model_name=None, budget_ms=None, cache_size=10000):
+        if model_name is None:
+            model_name = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+        if budget_ms is None:
+            budget_ms = float(os.getenv('RERANK_BUDGET_MS', '300'))
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.model = None
+        # Running per-pair cost; starts optimistic and adapts after the first call
+        self.pair_ms = INITIAL_PAIR_MS
+        self.timings = deque(maxlen=1000)
+
+    def _load(self):
+        if self.model is None:
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(self.model_name)
+        return self.model
+
+    def _key(self, query, doc):
+        return hashlib.sha1(f"{query}\0{doc.page_content}".encode('utf-8')).hexdigest()
+
+    def rerank(self, query, docs, k):
+        start = time.perf_counter()
+        keys = [self._key(query, doc) for doc in docs]
+        with self.lock:
+            scores = {key: self.cache[key] for key in keys if key in self.cache}
+
+        # Score as many uncached candidates (in retrieval order) as the budget allows
+        max_pairs = max(k, int(self.budget_ms / self.pair_ms))
+        pending = [i for i, key in enumerate(keys) if key not in scores][:max_pairs]
+        if pending:
+            # Load first so the one-off model load doesn't inflate the per-pair estimate
+            model = self._load()
+            model_start = time.perf_counter()
+            pairs = [(query, docs[i].page_content) for i in pending]
+            predicted = model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            elapsed_ms = (time.perf_counter() - model_start) * 1000
+            self.pair_ms = 0.7 * self.pair_ms + 0.3 * (elapsed_ms / len(pending))
+            with self.lock:
+                for i, score in zip(pending, predicted):
+                    scores[keys[i]] = float(score)
+                    self.cache[keys[i]] = float(score)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        scored = [i for i, key in enumerate(keys) if key in scores]
+        unscored = [i for i, key in enumerate(keys) if key not in scores]
+        scored.sort(key=lambda i: scores[keys[i]], reverse=True)
+        self.timings.append((time.perf_counter() - start) * 1000)
+        return [docs[i] for i in (scored + unscored)[:k]]
+
+@lru_cache(maxsize=None)
+def get_reranker():
+    """One shared reranker (model and score cache) per process"""
+    return CrossEncoderReranker()
+
+class RerankingRetriever(BaseRetriever):
+    """Retrieve a wide candidate set, then keep the k best by cross-encoder score"""
+
+    base_retriever: Any
+    reranker: Any
+    k: int = 8
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        candidates = self.base_retriever.invoke(query)
+        with span('rerank', candidates=len(candidates)):
+            return self.reranker.rerank(query, candidates, self.k)
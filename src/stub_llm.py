@@ -0,0 +1,50 @@
+import os
+import time
+from typing import Any, Iterator, List
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+class StubChatModel(SimpleChatModel):
+    """Offline stand-in for the HuggingFace endpoint, for load tests
+
+    Waits first_token_ms, then produces `tokens` words tokens_per_sec apart,
+    so generation time looks like a real endpoint's without the network.
+    The answer reports how much prompt it was given.
+    """
+
+    first_token_ms: float = 300.0
+    tokens: int = 120
+    tokens_per_sec: float = 40.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'stub'
+
+    def _words(self, messages):
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        words = f"Stub answer for a {prompt_chars}-character prompt.".split()
+        filler = ['lorem', 'ipsum', 'dolor', 'sit', 'amet']
+        while len(words) < self.tokens:
+            words.append(filler[len(words) % len(filler)])
+        return words
+
+    def _call(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> str:
+        words = self._words(messages)
+        time.sleep(self.first_token_ms / 1000 + len(words) / self.tokens_per_sec)
+        return ' '.join(words)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        for i, word in enumerate(self._words(messages)):
+            if i:
+                time.sleep(1 / self.tokens_per_sec)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else ' ' + word))
+
+def load_stub_llm():
+    """StubChatModel configured from STUB_LLM_FIRST_TOKEN_MS / STUB_LLM_TOKENS / STUB_LLM_TOKENS_PER_SEC"""
+    return StubChatModel(
+        first_token_ms=float(os.getenv('STUB_LLM_FIRST_TOKEN_MS', '300')),
+        tokens=int(os.getenv('STUB_LLM_TOKENS', '120')),
+        tokens_per_sec=float(os.getenv('STUB_LLM_TOKENS_PER_SEC', '40')),
+    )
@@ -0,0 +1,243 @@
+import re
+import ast
+import sqlite3
+import threading
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.tracing import span, annotate
+
+# tree-sitter grammar names (tree_sitter_languages) for non-Python extensions
+TREE_SITTER_LANGUAGES = {
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'tsx',
+    '.java': 'java',
+    '.cpp': 'cpp',
+    '.c': 'c',
+    '.cs': 'c_sharp',
+    '.go': 'go',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.rs': 'rust',
+    '.kt': 'kotlin',
+    '.scala': 'scala',
+}
+
+# tree-sitter node type -> symbol kind
+DEFINITION_KINDS = {
+    'function_declaration': 'function',
+    'function_definition': 'function',
+    'function_item': 'function',
+    'generator_function_declaration': 'function',
+    'method_declaration': 'method',
+    'method_definition': 'method',
+    'method': 'method',
+    'singleton_method': 'method',
+    'constructor_declaration': 'method',
+    'class_declaration': 'class',
+    'class_definition': 'class',
+    'class_specifier': 'class',
+    'class': 'class',
+    'object_declaration': 'object',
+    'object_definition': 'object',
+    'interface_declaration': 'interface',
+    'trait_item': 'trait',
+    'trait_definition': 'trait',
+    'struct_specifier': 'struct',
+    'struct_item': 'struct',
+    'struct_declaration': 'struct',
+    'enum_declaration': 'enum',
+    'enum_item': 'enum',
+    'enum_specifier': 'enum',
+    'type_spec': 'type',
+    'module': 'module',
+    'namespace_definition': 'namespace',
+}
+
+NAME_NODES = {'identifier', 'field_identifier', 'type_identifier', 'property_identifier',
+              'constant', 'name', 'simple_identifier'}
+
+def _python_symbols(source, text):
+    symbols = []
+
+    def visit(node, parent, in_class):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if isinstance(child, ast.ClassDef):
+                    kind = 'class'
+                else:
+                    kind = 'method' if in_class else 'function'
+                symbols.append({
+                    'name': child.name, 'kind': kind, 'source': source,
+                    'start_line': child.lineno, 'end_line': child.end_lineno, 'parent': parent,
+                })
+                visit(child, child.name, isinstance(child, ast.ClassDef))
+            else:
+                visit(child, parent, in_class)
+
+    visit(ast.parse(text), None, False)
+    return symbols
+
+def _node_name(node):
+    name = node.child_by_field_name('name')
+    if name is not None:
+        return name.text.decode('utf-8', errors='ignore')
+    # C/C++ functions keep the name inside nested declarators
+    declarator = node.child_by_field_name('declarator')
+    while declarator is not None:
+        if declarator.type == 'qualified_identifier':
+            # Widget::size -> size
+            declarator = declarator.child_by_field_name('name')
+            continue
+        if declarator.type in NAME_NODES or declarator.type.endswith('identifier'):
+            return declarator.text.decode('utf-8', errors='ignore')
+        declarator = declarator.child_by_field_name('declarator') or next(
+            (c for c in declarator.children if c.type in NAME_NODES), None
+        )
+    return None
+
+def _tree_sitter_symbols(source, text, grammar):
+    from tree_sitter_languages import get_parser
+    tree = get_parser(grammar).parse(text.encode('utf-8'))
+    symbols = []
+    stack = [(tree.root_node, None)]
+    while stack:
+        node, parent = stack.pop()
+        child_parent = parent
+        kind = DEFINITION_KINDS.get(node.type)
+        if kind:
+            name = _node_name(node)
+            if name:
+                symbols.append({
+                    'name': name, 'kind': kind, 'source': source,
+                    'start_line': node.start_point[0] + 1, 'end_line': node.end_point[0] + 1,
+                    'parent': parent,
+                })
+                child_parent = name
+        stack.extend((child, child_parent) for child in reversed(node.children))
+    return symbols
+
+def extract_symbols(source, text, ext):
+    """Return the functions/classes/... defined in a file as symbol dicts
+
+    Python uses the ast module; other languages use the tree-sitter grammars
+    LanguageParser already depends on. Unsupported or unparsable files
+    yield no symbols.
+    """
+    try:
+        if ext == '.py':
+            return _python_symbols(source, text)
+        if ext in TREE_SITTER_LANGUAGES:
+            return _tree_sitter_symbols(source, text, TREE_SITTER_LANGUAGES[ext])
+    except Exception:
+        # Symbols are best-effort; a file that won't parse is still chunked and embedded
+        pass
+    return []
+
+# Identifier-shaped words: snake_case, camelCase/PascalCase with an inner capital, dotted or call syntax
+BACKTICKED = re.compile(r'`([A-Za-z_][\w.]*)(?:\(\))?`')
+SNAKE_OR_CAMEL = re.compile(r'\b([A-Za-z]\w*_\w+|_\w+|[a-z]+[A-Z]\w*|[A-Z][a-z0-9]+[A-Z]\w*)\b')
+CALL = re.compile(r'\b([A-Za-z_]\w*)\(\)')
+
+def symbol_mentions(query):
+    """Names in a question that look like code identifiers rather than prose"""
+    names = []
+    for pattern in (BACKTICKED, CALL, SNAKE_OR_CAMEL):
+        for match in pattern.findall(query):
+            # Class.method -> look up the method name
+            names.append(match.split('.')[-1])
+    return list(dict.fromkeys(names))
+
+class SymbolIndex:
+    """Per-project symbol table (name, kind, file, line span, parent) in SQLite"""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS symbols (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                source TEXT NOT NULL,
+                start_line INTEGER NOT NULL,
+                end_line INTEGER NOT NULL,
+                parent TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols (name);
+            CREATE INDEX IF NOT EXISTS idx_symbols_source ON symbols (source);
+        ''')
+        self.conn.commit()
+
+    def add_symbols(self, symbols):
+        with self.lock:
+            self.conn.executemany(
+                'INSERT INTO symbols (name, kind, source, start_line, end_line, parent) '
+                'VALUES (:name, :kind, :source, :start_line, :end_line, :parent)',
+                symbols
+            )
+            self.conn.commit()
+
+    def delete_sources(self, sources):
+        with self.lock:
+            self.conn.executemany('DELETE FROM symbols WHERE source = ?', [(s,) for s in sources])
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM symbols')
+            self.conn.commit()
+
+    def lookup(self, names, limit=8):
+        """Definitions whose name exactly matches one of names (index seek per name)"""
+        if not names:
+            return []
+        marks = ','.join('?' * len(names))
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT name, kind, source, start_line, end_line, parent FROM symbols '
+                f'WHERE name IN ({marks}) ORDER BY name, source, start_line LIMIT ?',
+                [*names, limit]
+            ).fetchall()
+        keys = ['name', 'kind', 'source', 'start_line', 'end_line', 'parent']
+        return [dict(zip(keys, row)) for row in rows]
+
+def read_definition(symbol, max_chars=6000):
+    """Source text of a symbol's definition, read from the cloned repository"""
+    with open(symbol['source'], encoding='utf-8', errors='ignore') as f:
+        lines = f.readlines()[symbol['start_line'] - 1:symbol['end_line']]
+    return ''.join(lines)[:max_chars]
+
+class SymbolRetriever(BaseRetriever):
+    """Answer questions that name a symbol with its definition, skipping the search
+
+    Falls back to the wrapped retriever when the question names no known symbol.
+    """
+
+    symbol_index: Any
+    fallback: Any
+    k: int = 8
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        docs = []
+        with span('symbol_lookup'):
+            for symbol in self.symbol_index.lookup(symbol_mentions(query), limit=self.k):
+                try:
+                    content = read_definition(symbol)
+                except OSError:
+                    # File vanished since indexing; let the normal search handle it
+                    continue
+                docs.append(Document(page_content=content, metadata={
+                    'source': symbol['source'],
+                    'symbol': symbol['name'],
+                    'kind': symbol['kind'],
+                    'start_line': symbol['start_line'],
+                    'end_line': symbol['end_line'],
+                }))
+            annotate(hits=len(docs))
+        if docs:
+            return docs
+        return self.fallback.invoke(query)
@@ -0,0 +1,206 @@
+import io
+import os
+import json
+import time
+import uuid
+import pstats
+import sqlite3
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_current = contextvars.ContextVar('trace', default=None)
+
+class Span:
+    """One timed step of a trace; start_ms is relative to the start of the trace"""
+
+    def __init__(self, name, start_ms, attrs):
+        self.name = name
+        self.start_ms = start_ms
+        self.duration_ms = None
+        self.attrs = dict(attrs)
+        self.error = None
+        self.children = []
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'start_ms': round(self.start_ms, 2),
+            'duration_ms': round(self.duration_ms or 0.0, 2),
+            'attrs': self.attrs,
+            'error': self.error,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+class Trace:
+    """Span tree for one request (a chat turn)"""
+
+    def __init__(self, name, trace_id=None, **attrs):
+        self.id = trace_id or uuid.uuid4().hex
+        self.timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self.started = time.perf_counter()
+        self.root = Span(name, 0.0, attrs)
+        self.stack = [self.root]
+        self.profile = None
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+@contextmanager
+def span(name, **attrs):
+    """Record the block as a child of the innermost open span; a no-op outside a trace"""
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    child = Span(name, trace.elapsed_ms(), attrs)
+    trace.stack[-1].children.append(child)
+    trace.stack.append(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.duration_ms = trace.elapsed_ms() - child.start_ms
+        trace.stack.remove(child)
+
+def annotate(**attrs):
+    """Attach attributes (chunk ids, token counts...) to the innermost open span"""
+    trace = _current.get()
+    if trace is not None:
+        trace.stack[-1].attrs.update(attrs)
+
+def format_profile(profiler, limit=40):
+    """Top functions by cumulative time, as pstats prints them"""
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+@contextmanager
+def start_trace(name, store=None, profile=False, project_name=None, trace_id=None, **attrs):
+    """Trace the block as one request and save it to store (a TraceStore) when it ends
+
+    With profile=True the block also runs under cProfile and the report is
+    saved with the trace. Exceptions mark the root span and are re-raised;
+    the trace is saved either way.
+    """
+    trace = Trace(name, trace_id, **attrs)
+    token = _current.set(trace)
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        trace.root.duration_ms = trace.elapsed_ms()
+        if profiler:
+            trace.profile = format_profile(profiler)
+        _current.reset(token)
+        if store is not None:
+            store.save(trace, project_name)
+
+def tracing_enabled():
+    return os.getenv('TRACE_REQUESTS', '1') != '0'
+
+class TraceStore:
+    """Request traces in SQLite, kept in the same database as chat_sessions
+
+    Only the newest max_traces (default TRACE_RETENTION, 1000) are kept.
+    """
+
+    def __init__(self, db_path, max_traces=None):
+        if max_traces is None:
+            max_traces = int(os.getenv('TRACE_RETENTION', '1000'))
+        self.max_traces = max_traces
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS request_traces (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                project_name TEXT,
+                name TEXT NOT NULL,
+                question TEXT,
+                duration_ms REAL NOT NULL,
+                error TEXT,
+                spans TEXT NOT NULL,
+                profile TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_request_traces_project ON request_traces (project_name, seq)'
+        )
+        self.conn.commit()
+
+    def save(self, trace, project_name=None):
+        root = trace.root
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO request_traces (id, project_name, name, question, duration_ms, error, spans, profile, timestamp) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (trace.id, project_name, root.name, root.attrs.get('question'), root.duration_ms,
+                 root.error, json.dumps(root.to_dict()), trace.profile, trace.timestamp)
+            )
+            self.conn.execute(
+                'DELETE FROM request_traces WHERE seq <= (SELECT MAX(seq) FROM request_traces) - ?',
+                (self.max_traces,)
+            )
+            self.conn.commit()
+
+    def get(self, trace_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT id, project_name, name, question, duration_ms, error, timestamp, spans, profile '
+                'FROM request_traces WHERE id = ?', (trace_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        trace = self._summary(row)
+        trace['spans'] = json.loads(row[7])
+        trace['profile'] = row[8]
+        return trace
+
+    def recent(self, project_name=None, limit=20):
+        """Newest first, without the span trees and profiles"""
+        query = 'SELECT id, project_name, name, question, duration_ms, error, timestamp, profile IS NOT NULL FROM request_traces'
+        params = []
+        if project_name is not None:
+            query += ' WHERE project_name = ?'
+            params.append(project_name)
+        query += ' ORDER BY seq DESC LIMIT ?'
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [{**self._summary(row), 'profiled': bool(row[7])} for row in rows]
+
+    def _summary(self, row):
+        return {
+            'id': row[0], 'project_name': row[1], 'name': row[2], 'question': row[3],
+            'duration_ms': round(row[4], 1), 'error': row[5], 'timestamp': row[6],
+        }
+
+def span_lines(node, depth=0):
+    """Indented one-line-per-span rendering of a stored span tree"""
+    attrs = ', '.join(
+        f"{key}={len(value) if isinstance(value, list) else value}" for key, value in node['attrs'].items()
+        if key != 'question'
+    )
+    line = f"{'  ' * depth}{node['name']}  {node['duration_ms']:.1f} ms"
+    if attrs:
+        line += f"  ({attrs})"
+    if node.get('error'):
+        line += f"  !! {node['error']}"
+    lines = [line]
+    for child in node['children']:
+        lines.extend(span_lines(child, depth + 1))
+    return lines
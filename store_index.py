@@ -1,11 +1,17 @@
-from src.helper import repo_ingestion,load_repo,text_splitter,load_embedding
+from src.helper import repo_ingestion,load_embedding,stream_index
 from dotenv import load_dotenv
 load_dotenv()
 from langchain_community.vectorstores import Chroma
 import os
-documents=load_repo('repo/')
-text_chunks=text_splitter(documents)
-embeddings=load_embedding()
-vectordb=Chroma.from_documents(text_chunks,embedding=embeddings,persist_directory='./db')
+if __name__=='__main__':
+    # Guarded so INGEST_WORKERS>1 pool workers don't re-run the script on spawn
+    embeddings=load_embedding()
+    # Bounded batches keep memory flat (INGEST_MEMORY_MB) whatever the repo size
+    vectordb,stats=stream_index('repo/','./db',embeddings,include_text=False)
+    print(f"Indexed {stats['chunks']} chunks from {stats['documents']} documents, peak RSS {stats['peak_rss_mb']} MB")
+    print(f"Embedding: {stats['embed_seconds']}s, {stats['embed_chunks_per_sec']} chunks/sec "
+          f"({stats['embed_cache_hits']} chunks from the cache)")
+    print(f"Skipped {stats.get('skipped_files',0)} files ({stats.get('skipped_bytes',0)} bytes): {stats.get('reasons',{})}")
+    print(f"Near-duplicate chunks: {stats.get('near_duplicates',{})}")
 
-vectordb.persist()
+    vectordb.persist()
@@ -1,79 +1,52 @@
 import streamlit as st
 import os
 import json
-import sqlite3
 from datetime import datetime
 from pathlib import Path
 from git import Repo
 from github import Github
-from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
-from langchain_community.document_loaders.generic import GenericLoader
-from langchain_community.document_loaders.parsers import LanguageParser
-from langchain_huggingface import HuggingFaceEmbeddings, ChatHuggingFace, HuggingFaceEndpoint
-from langchain_community.vectorstores import Chroma
+from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
+from src.chat_store import ChatStore
+from src.prompt import project_template, cross_project_template
+from src.chain_registry import ChainRegistry
+from src.answer_cache import AnswerCache
+from src.jobs import JobQueue
+from src.metrics import metrics
+from src.tracing import TraceStore, start_trace, span, annotate, span_lines, tracing_enabled
+from src.helper import StagedChain, clone_repository, load_embedding, load_and_split, index_chunks, open_vectorstore, stream_index, open_lexical_index, open_symbol_index, open_duplicate_index, clear_index, build_retriever, diff_commits, source_path, drop_sources, cross_project_enabled, shared_index_directory, add_to_shared_index, backfill_shared_index, remove_from_shared_index
 import shutil
-import time
+import threading
 
 load_dotenv()
 
 # Database setup
 DB_PATH = "chat_sessions.db"
 
+@st.cache_resource(show_spinner=False)
+def get_chat_store():
+    """Shared chat history store (one WAL-mode connection, batched writes)"""
+    return ChatStore(DB_PATH)
+
 def init_database():
     """Initialize SQLite database for chat sessions"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create chat_sessions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_name TEXT NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    get_chat_store()
 
 def save_message(project_name, role, content):
     """Save a chat message to database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO chat_sessions (project_name, role, content) VALUES (?, ?, ?)',
-            (project_name, role, content)
-        )
-        conn.commit()
-        conn.close()
+        get_chat_store().save_message(project_name, role, content)
     except Exception as e:
         st.error(f"Error saving message: {e}")
 
-def load_chat_history(project_name):
-    """Load chat history for a project from database"""
+def load_chat_history(project_name, limit=None, before=None):
+    """Load chat history for a project from database
+
+    limit returns only the newest messages; before=(timestamp, id) pages further back.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT role, content, timestamp FROM chat_sessions WHERE project_name = ? ORDER BY timestamp',
-            (project_name,)
-        )
-        messages = []
-        for row in cursor.fetchall():
-            messages.append({
-                'role': row[0],
-                'content': row[1],
-                'timestamp': row[2]
-            })
-        conn.close()
-        return messages
+        return get_chat_store().load_messages(project_name, limit=limit, before=before)
     except Exception as e:
         st.error(f"Error loading chat history: {e}")
         return []
@@ -81,27 +54,32 @@ def load_chat_history(project_name):
 def clear_chat_history(project_name):
     """Clear chat history for a project"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM chat_sessions WHERE project_name = ?', (project_name,))
-        conn.commit()
-        conn.close()
+        get_chat_store().clear(project_name)
         return True
     except Exception as e:
         st.error(f"Error clearing chat history: {e}")
         return False
 
+# Number of messages rendered per page of chat history
+CHAT_PAGE_SIZE = int(os.getenv('CHAT_PAGE_SIZE', '50'))
+
+def load_history_window(project_name):
+    """Load only the most recent page of a project's chat history into the session"""
+    page = load_chat_history(project_name, limit=CHAT_PAGE_SIZE)
+    st.session_state.chat_history = page
+    st.session_state.chat_has_older = len(page) == CHAT_PAGE_SIZE
+
+def load_older_messages(project_name):
+    """Prepend the page of messages preceding the oldest one on screen"""
+    oldest = st.session_state.chat_history[0]
+    older = load_chat_history(project_name, limit=CHAT_PAGE_SIZE, before=(oldest['timestamp'], oldest['id']))
+    st.session_state.chat_history = older + st.session_state.chat_history
+    st.session_state.chat_has_older = len(older) == CHAT_PAGE_SIZE
+
 def get_chat_stats(project_name):
     """Get chat statistics for a project"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM chat_sessions WHERE project_name = ?',
-            (project_name,)
-        )
-        result = cursor.fetchone()
-        conn.close()
+        result = get_chat_store().stats(project_name)
         return {
             'total_messages': result[0] if result[0] else 0,
             'first_message': result[1],
@@ -127,10 +105,16 @@ if 'current_project' not in st.session_state:
     st.session_state.current_project = None
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
+if 'chat_has_older' not in st.session_state:
+    st.session_state.chat_has_older = False
 if 'embeddings' not in st.session_state:
     st.session_state.embeddings = None
 if 'model' not in st.session_state:
     st.session_state.model = None
+if 'pending_jobs' not in st.session_state:
+    st.session_state.pending_jobs = {}
+if 'cross_projects' not in st.session_state:
+    st.session_state.cross_projects = []
 
 # Load persistent projects
 PROJECTS_FILE = "projects.json"
@@ -141,9 +125,19 @@ def load_projects():
             return json.load(f)
     return {}
 
-def save_projects():
-    with open(PROJECTS_FILE, 'w') as f:
-        json.dump(st.session_state.projects, f, indent=2)
+# Ingest jobs write projects.json from their own threads
+projects_lock = threading.Lock()
+
+def write_project(project_name, project):
+    """Update one project record in projects.json; project=None removes it"""
+    with projects_lock:
+        projects = load_projects()
+        if project is None:
+            projects.pop(project_name, None)
+        else:
+            projects[project_name] = project
+        with open(PROJECTS_FILE, 'w') as f:
+            json.dump(projects, f, indent=2)
 
 # Initialize
 if not st.session_state.projects:
@@ -151,7 +145,7 @@ if not st.session_state.projects:
 
 @st.cache_resource
 def load_embedding_model():
-    return HuggingFaceEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')
+    return load_embedding()
 
 @st.cache_resource
 def load_llm():
@@ -173,7 +167,7 @@ def clone_repo(repo_url, project_name):
     if os.path.exists(repo_path):
         shutil.rmtree(repo_path, onerror=handle_remove_readonly)
     os.makedirs(repo_path, exist_ok=True)
-    Repo.clone_from(repo_url, to_path=repo_path)
+    clone_repository(repo_url, repo_path)
     return repo_path
 
 def get_repo_metadata(repo_url, github_token=None):
@@ -214,162 +208,82 @@ def get_repo_metadata(repo_url, github_token=None):
     except Exception as e:
         return {'error': str(e)}
 
-def load_repo_files(repo_path):
-    """Load all code files from repository - supports multiple languages"""
-    all_documents = []
-    
-    # Define language mappings
-    language_map = {
-        '.py': Language.PYTHON,
-        '.js': Language.JS,
-        '.ts': Language.JS,
-        '.jsx': Language.JS,
-        '.tsx': Language.JS,
-        '.java': Language.JAVA,
-        '.cpp': Language.CPP,
-        '.c': Language.C,
-        '.cs': Language.CSHARP,
-        '.go': Language.GO,
-        '.rb': Language.RUBY,
-        '.php': Language.PHP,
-        '.rs': Language.RUST,
-        '.kt': Language.KOTLIN,
-        '.swift': Language.SWIFT,
-        '.scala': Language.SCALA,
-        '.html': Language.HTML,
-        '.md': Language.MARKDOWN,
-    }
-    
-    # Load files by language
-    for ext, lang in language_map.items():
-        try:
-            loader = GenericLoader.from_filesystem(
-                repo_path,
-                glob=f'**/*{ext}',
-                suffixes=[ext],
-                parser=LanguageParser(language=lang, parser_threshold=0)
-            )
-            docs = loader.load()
-            all_documents.extend(docs)
-        except Exception as e:
-            # Skip if language not supported or no files found
-            pass
-    
-    # Also load common text files (README, config files, etc.)
-    text_extensions = ['.txt', '.json', '.yaml', '.yml', '.toml', '.ini', '.cfg', '.conf', '.xml']
-    for ext in text_extensions:
-        try:
-            from langchain_community.document_loaders import TextLoader
-            import glob
-            
-            pattern = os.path.join(repo_path, f'**/*{ext}')
-            for file_path in glob.glob(pattern, recursive=True):
-                try:
-                    loader = TextLoader(file_path, encoding='utf-8')
-                    docs = loader.load()
-                    all_documents.extend(docs)
-                except:
-                    pass
-        except:
-            pass
-    
-    return all_documents
-
-def split_documents(documents):
-    """Split documents intelligently based on content type"""
-    all_chunks = []
-    
-    # Group documents by language/type
-    for doc in documents:
-        try:
-            # Detect language from file extension
-            source = doc.metadata.get('source', '')
-            ext = os.path.splitext(source)[1].lower()
-            
-            # Choose appropriate splitter
-            if ext in ['.py']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.PYTHON, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.js', '.jsx', '.ts', '.tsx']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.JS, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.java']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.JAVA, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.cpp', '.c', '.h', '.hpp']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.CPP, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.go']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.GO, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.rs']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.RUST, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.rb']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.RUBY, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.md', '.markdown']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.MARKDOWN, chunk_size=2000, chunk_overlap=200
-                )
-            elif ext in ['.html', '.htm']:
-                splitter = RecursiveCharacterTextSplitter.from_language(
-                    language=Language.HTML, chunk_size=2000, chunk_overlap=200
-                )
-            else:
-                # Generic text splitter for other files
-                splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=2000, chunk_overlap=200
-                )
-            
-            chunks = splitter.split_documents([doc])
-            all_chunks.extend(chunks)
-        except Exception as e:
-            # Fallback to generic splitter
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=2000, chunk_overlap=200
-            )
-            chunks = splitter.split_documents([doc])
-            all_chunks.extend(chunks)
-    
-    return all_chunks
-
-def create_vectorstore(text_chunks, project_name, embeddings):
-    """Create Chroma vectorstore for project"""
-    try:
-        persist_dir = f"db/{project_name}"
-        vectorstore = Chroma.from_documents(
-            documents=text_chunks,
-            embedding=embeddings,
-            persist_directory=persist_dir
-        )
-        return vectorstore
-    except Exception as e:
-        st.error(f"Error creating vectorstore: {e}")
-        return None
-
 def load_vectorstore(project_name, embeddings):
-    """Load Chroma vectorstore for specific project"""
+    """Load the vectorstore (Chroma or quantized) for specific project"""
     try:
         persist_dir = f"db/{project_name}"
         if os.path.exists(persist_dir):
-            vectorstore = Chroma(
-                persist_directory=persist_dir,
-                embedding_function=embeddings
-            )
+            vectorstore = open_vectorstore(persist_dir, embeddings)
             return vectorstore
         return None
     except Exception as e:
         st.error(f"Error loading vectorstore: {e}")
         return None
 
+@st.cache_resource
+def get_chain_registry():
+    return ChainRegistry(max_size=int(os.getenv('CHAIN_CACHE_SIZE', '8')))
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(DB_PATH)
+
+@st.cache_resource
+def get_trace_store():
+    return TraceStore(DB_PATH) if tracing_enabled() else None
+
+def chat_trace(project_name, question):
+    """Trace one chat turn into chat_sessions.db, under cProfile if the sidebar asked for it"""
+    return start_trace('chat', store=get_trace_store(), profile=st.session_state.pop('profile_next', False),
+                       project_name=project_name, question=question)
+
+def invalidate_project_caches(project_name):
+    """Forget the cached chain and answers after a project is re-indexed or deleted"""
+    get_chain_registry().invalidate(project_name)
+    get_chain_registry().invalidate_prefix(CROSS_PROJECT)
+    get_answer_cache().invalidate(project_name)
+
+def build_project_chain(project_name):
+    """Open the project's vector store and build its QA chain"""
+    embeddings = load_embedding_model()
+    model = load_llm()
+    
+    vectordb = load_vectorstore(project_name, embeddings)
+    if not vectordb:
+        return None
+    
+    # Get project metadata for context
+    project_meta = st.session_state.projects.get(project_name, {})
+    prompt_template = ChatPromptTemplate.from_template(project_template(project_meta))
+    
+    # Runs stage by stage so retrieval, prompt and generation show up in Diagnostics
+    qa_chain = StagedChain(build_retriever(vectordb, f"db/{project_name}", k=8), prompt_template, model)
+    return {'vectordb': vectordb, 'chain': qa_chain}
+
+def get_project_chain(project_name):
+    """Return the cached QA chain for a project, or None if it has no vector store"""
+    entry = get_chain_registry().get(project_name, lambda: build_project_chain(project_name))
+    return entry['chain'] if entry else None
+
+# Chat history key (and chain registry prefix) for cross-project questions
+CROSS_PROJECT = "__cross_project__"
+
+def build_cross_project_chain(project_names):
+    """QA chain over the shared index, filtered to project_names in a single query"""
+    directory = shared_index_directory()
+    if not os.path.exists(directory):
+        return None
+    vectordb = open_vectorstore(directory, load_embedding_model())
+    prompt_template = ChatPromptTemplate.from_template(cross_project_template(project_names))
+    qa_chain = StagedChain(build_retriever(vectordb, directory, k=8, projects=project_names), prompt_template, load_llm())
+    return {'vectordb': vectordb, 'chain': qa_chain}
+
+def get_cross_project_chain(project_names):
+    project_names = sorted(project_names)
+    key = f"{CROSS_PROJECT}:{','.join(project_names)}"
+    entry = get_chain_registry().get(key, lambda: build_cross_project_chain(project_names))
+    return entry['chain'] if entry else None
+
 def generate_report(project_name, chat_history, project_data):
     """Generate PDF report of repository analysis"""
     try:
@@ -546,6 +460,52 @@ def check_for_updates(project_name):
     except:
         return False
 
+def reindex_changed_files(project_name, repo_path, old_sha, embeddings):
+    """Re-embed only the files changed since old_sha; returns False if a full re-index is needed"""
+    if not old_sha:
+        return False
+    vectordb = load_vectorstore(project_name, embeddings)
+    if vectordb is None:
+        return False
+    try:
+        removed, updated = diff_commits(repo_path, old_sha)
+    except Exception:
+        # Old commit no longer in history (force push, shallow clone)
+        return False
+    
+    # Drop vectors, lexical postings and symbols for deleted, modified and renamed files
+    lexical = open_lexical_index(f"db/{project_name}")
+    symbol_index = open_symbol_index(f"db/{project_name}")
+    sources = [source_path(repo_path, p) for p in removed]
+    if sources:
+        stale = vectordb.get(where={'source': {'$in': sources}}, include=['metadatas'])
+        # Identical copies of a changed file were skipped at index time; embed them now
+        copies = {
+            copy for metadata in stale['metadatas'] for copy in (metadata or {}).get('duplicate_files', '').split('\n')
+            if copy and copy not in removed and os.path.exists(source_path(repo_path, copy))
+        }
+        updated = sorted(set(updated) | copies)
+        drop_sources(vectordb, sources, open_duplicate_index(f"db/{project_name}"))
+        lexical.delete_sources(sources)
+        symbol_index.delete_sources(sources)
+        if cross_project_enabled():
+            remove_from_shared_index(embeddings, sources=sources)
+    
+    # Embed only added and modified files
+    if updated:
+        symbols, collapsed = [], []
+        document_count, text_chunks = load_and_split(repo_path, paths=updated, symbols=symbols, collapsed=collapsed)
+        # Also records the new chunks' near-duplicate sources
+        index_chunks(text_chunks, f"db/{project_name}", embeddings)
+        # Collapsed near-duplicates stay searchable by keyword
+        lexical.add_documents(collapsed)
+        if cross_project_enabled() and (text_chunks or collapsed):
+            add_to_shared_index(project_name, text_chunks, embeddings, collapsed)
+        symbol_index.add_symbols(symbols)
+    
+    st.session_state.projects[project_name]['chunks'] = len(vectordb.get(include=[])['ids'])
+    return True
+
 def update_repo(project_name):
     """Pull latest changes and re-index"""
     repo_path = f"repos/{project_name}"
@@ -553,22 +513,109 @@ def update_repo(project_name):
         repo = Repo(repo_path)
         repo.remotes.origin.pull()
         
-        # Re-index
-        documents = load_repo_files(repo_path)
-        if documents:
-            text_chunks = split_documents(documents)
-            embeddings = load_embedding_model()
-            create_vectorstore(text_chunks, project_name, embeddings)
-            
-            # Update metadata
-            st.session_state.projects[project_name]['last_updated'] = datetime.now().isoformat()
-            st.session_state.projects[project_name]['last_commit'] = get_last_commit_hash(repo_path)
-            save_projects()
-            return True
+        last_commit = st.session_state.projects[project_name].get('last_commit') or {}
+        embeddings = load_embedding_model()
+        
+        # Incremental re-index from the git diff, full re-index as fallback
+        if not reindex_changed_files(project_name, repo_path, last_commit.get('sha'), embeddings):
+            clear_index(f"db/{project_name}", embeddings)
+            if cross_project_enabled():
+                remove_from_shared_index(embeddings, project_name=project_name)
+            _, stats = stream_index(repo_path, f"db/{project_name}", embeddings, project_name=project_name)
+            if not stats['documents']:
+                return False
+            st.session_state.projects[project_name]['chunks'] = stats['chunks']
+            st.session_state.projects[project_name]['files'] = stats['documents']
+            st.session_state.projects[project_name]['skipped'] = stats
+        
+        # Update metadata
+        st.session_state.projects[project_name]['last_updated'] = datetime.now().isoformat()
+        st.session_state.projects[project_name]['last_commit'] = get_last_commit_hash(repo_path)
+        write_project(project_name, st.session_state.projects[project_name])
+        invalidate_project_caches(project_name)
+        return True
     except Exception as e:
         st.error(f"Update failed: {e}")
     return False
 
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(DB_PATH)
+
+def ingest_project(job, repo_url, project_name, github_token, embeddings):
+    """Clone, parse, split and embed a repository; runs on the ingestion job queue
+
+    Must not touch st.* - it runs outside the script thread. The project
+    record is written to projects.json and returned as the job result.
+    """
+    # Clone repo
+    repo_path = clone_repo(repo_url, project_name)
+    job.report('cloned')
+    
+    # Get metadata
+    metadata = get_repo_metadata(repo_url, github_token)
+    
+    # Parse, split, embed and store in bounded batches (parsed in parallel when INGEST_WORKERS > 1)
+    # Re-adding a project replaces its vectors, BM25 entries and symbols
+    clear_index(f"db/{project_name}", embeddings)
+    if cross_project_enabled():
+        # Re-adding a project replaces its chunks in the shared index
+        remove_from_shared_index(embeddings, project_name=project_name)
+    _, stats = stream_index(
+        repo_path, f"db/{project_name}", embeddings, project_name=project_name, progress=job.report
+    )
+    if not stats['documents']:
+        raise ValueError("No code files found in repository. Please check the repository URL.")
+    job.report('embedded', documents=stats['documents'], embedded=stats['chunks'],
+               skipped_files=stats.get('skipped_files', 0), skipped_bytes=stats.get('skipped_bytes', 0),
+               duplicate_reduction=stats['near_duplicates']['reduction'], peak_rss_mb=stats['peak_rss_mb'],
+               chunks_per_sec=stats['embed_chunks_per_sec'])
+    
+    project = {
+        'url': repo_url,
+        'added': datetime.now().isoformat(),
+        'last_updated': datetime.now().isoformat(),
+        'last_commit': get_last_commit_hash(repo_path),
+        'chunks': stats['chunks'],
+        'files': stats['documents'],
+        'skipped': stats,
+        'metadata': metadata
+    }
+    # Persist even if the session that queued the job has gone away
+    write_project(project_name, project)
+    return project
+
+def render_ingest_jobs():
+    """Show progress of this session's ingestion jobs and pick up finished ones"""
+    finished = False
+    for job_id, name in list(st.session_state.pending_jobs.items()):
+        job = get_job_queue().get(job_id)
+        if job is None:
+            del st.session_state.pending_jobs[job_id]
+        elif job['status'] == 'done':
+            # The job already wrote projects.json
+            st.session_state.projects[name] = job['result']
+            invalidate_project_caches(name)
+            del st.session_state.pending_jobs[job_id]
+            finished = True
+        elif job['status'] == 'failed':
+            st.error(f"{name}: {job['error']}")
+            del st.session_state.pending_jobs[job_id]
+        else:
+            progress = job['progress']
+            status = f"⏳ {name}: {job['stage'] or job['status']}"
+            if progress.get('total_files'):
+                status += f" · {progress['files']}/{progress['total_files']} files"
+            if progress.get('skipped_files'):
+                status += f" · {progress['skipped_files']} skipped ({progress['skipped_bytes'] / (1024 * 1024):.1f} MB)"
+            if progress.get('embedded'):
+                status += f" · {progress['embedded']}/{progress['chunks']} chunks embedded"
+            if progress.get('chunks_per_sec'):
+                status += f" · {progress['chunks_per_sec']:.0f} chunks/sec"
+            st.caption(status)
+    if finished:
+        st.rerun()
+
 # Sidebar
 with st.sidebar:
     st.title("🤖 GitHub Repo AI Agent")
@@ -593,42 +640,21 @@ with st.sidebar:
         submit = st.form_submit_button("Add Repository")
         
         if submit and repo_url and project_name:
-            with st.spinner(f"Cloning and indexing {project_name}..."):
-                try:
-                    # Clone repo
-                    repo_path = clone_repo(repo_url, project_name)
-                    
-                    # Get metadata
-                    metadata = get_repo_metadata(repo_url, github_token if github_token else None)
-                    
-                    # Load and process files
-                    documents = load_repo_files(repo_path)
-                    
-                    if not documents:
-                        st.error("No code files found in repository. Please check the repository URL.")
-                    else:
-                        text_chunks = split_documents(documents)
-                        
-                        # Create embeddings and vectorstore
-                        embeddings = load_embedding_model()
-                        create_vectorstore(text_chunks, project_name, embeddings)
-                        
-                        # Save project
-                        st.session_state.projects[project_name] = {
-                            'url': repo_url,
-                            'added': datetime.now().isoformat(),
-                            'last_updated': datetime.now().isoformat(),
-                            'last_commit': get_last_commit_hash(repo_path),
-                            'chunks': len(text_chunks),
-                            'files': len(documents),
-                            'metadata': metadata
-                        }
-                        save_projects()
-                        
-                        st.success(f"✓ {project_name} added successfully!")
-                        st.rerun()
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            # Clone and index in the background so the form returns immediately
+            job_id = get_job_queue().submit(
+                f"ingest {project_name}", ingest_project,
+                repo_url, project_name, github_token if github_token else None, load_embedding_model()
+            )
+            st.session_state.pending_jobs[job_id] = project_name
+            st.info(f"Queued {project_name} for indexing")
+    
+    if st.session_state.pending_jobs:
+        # Poll job progress every few seconds without rerunning the whole page
+        if hasattr(st, 'fragment'):
+            st.fragment(run_every=2)(render_ingest_jobs)()
+        else:
+            render_ingest_jobs()
+            st.button("Refresh progress")
     
     st.markdown("---")
     st.subheader("Your Projects")
@@ -641,7 +667,7 @@ with st.sidebar:
                 if st.button(f"📁 {proj_name}", key=f"select_{proj_name}", use_container_width=True):
                     st.session_state.current_project = proj_name
                     # Load chat history from database
-                    st.session_state.chat_history = load_chat_history(proj_name)
+                    load_history_window(proj_name)
                     st.rerun()
             
             with col2:
@@ -656,6 +682,9 @@ with st.sidebar:
             
             with col3:
                 if st.button("🗑️", key=f"delete_{proj_name}", help="Delete project"):
+                    # Drop the cached chain, answers and vector store client first
+                    invalidate_project_caches(proj_name)
+                    
                     # Delete files
                     repo_path = f"repos/{proj_name}"
                     db_path = f"db/{proj_name}"
@@ -664,18 +693,127 @@ with st.sidebar:
                         shutil.rmtree(repo_path, onerror=handle_remove_readonly)
                     if os.path.exists(db_path):
                         shutil.rmtree(db_path, onerror=handle_remove_readonly)
+                    if cross_project_enabled():
+                        remove_from_shared_index(load_embedding_model(), project_name=proj_name)
                     
                     del st.session_state.projects[proj_name]
-                    save_projects()
+                    write_project(proj_name, None)
                     
                     if st.session_state.current_project == proj_name:
                         st.session_state.current_project = None
+                    if proj_name in st.session_state.cross_projects:
+                        st.session_state.cross_projects.remove(proj_name)
                     st.rerun()
     else:
         st.info("No projects yet. Add one above!")
+    
+    if cross_project_enabled() and len(st.session_state.projects) > 1:
+        st.markdown("---")
+        st.subheader("Search Across Projects")
+        selected = st.multiselect("Projects", list(st.session_state.projects.keys()),
+                                  default=[p for p in st.session_state.cross_projects if p in st.session_state.projects])
+        if st.button("🔎 Ask across projects", disabled=not selected, use_container_width=True):
+            embeddings = load_embedding_model()
+            with st.spinner("Preparing shared index..."):
+                for name in selected:
+                    vectordb = load_vectorstore(name, embeddings)
+                    if vectordb is not None and backfill_shared_index(name, vectordb, embeddings):
+                        get_chain_registry().invalidate_prefix(CROSS_PROJECT)
+            st.session_state.cross_projects = selected
+            st.session_state.current_project = CROSS_PROJECT
+            load_history_window(CROSS_PROJECT)
+            st.rerun()
+    
+    st.markdown("---")
+    with st.expander("🩺 Diagnostics", expanded=False):
+        # Ingest jobs and chats in this process; the Flask app exposes the same at /metrics
+        rows = metrics.snapshot()
+        if rows:
+            st.dataframe(rows, use_container_width=True)
+            slowest = max(rows, key=lambda row: row['total_s'])
+            st.caption(f"Most time: **{slowest['stage']}**, {slowest['total_s']:.1f} s over {slowest['calls']} runs. "
+                       "Percentiles cover the last 512 runs of each stage.")
+            if st.button("Reset metrics"):
+                metrics.reset()
+                st.rerun()
+        else:
+            st.caption("No timings yet. Index a repository or ask a question.")
+        
+        if get_trace_store() is not None:
+            st.markdown("**Request traces**")
+            if st.session_state.get('profile_next'):
+                st.caption("🔬 The next answer will be profiled")
+            elif st.button("🔬 Profile next answer", help="Run the next chat turn under cProfile"):
+                st.session_state.profile_next = True
+                st.rerun()
+            recent = get_trace_store().recent(st.session_state.current_project, limit=10)
+            if recent:
+                labels = {
+                    t['id']: f"{t['duration_ms'] / 1000:.1f}s · {(t['question'] or '')[:40]}{' · profiled' if t['profiled'] else ''}"
+                    for t in recent
+                }
+                trace_id = st.selectbox("Recent turns", list(labels), format_func=labels.get)
+                trace = get_trace_store().get(trace_id)
+                st.code('\n'.join(span_lines(trace['spans'])), language=None)
+                retrieved = next((node['attrs'] for node in trace['spans']['children']
+                                  if node['name'] == 'retrieve'), None)
+                if retrieved and retrieved.get('chunk_ids'):
+                    st.caption("Retrieved chunks")
+                    st.dataframe([{'id': chunk, 'source': source} for chunk, source
+                                  in zip(retrieved['chunk_ids'], retrieved['sources'])], use_container_width=True)
+                if trace['profile']:
+                    st.caption("cProfile (top 40 by cumulative time)")
+                    st.code(trace['profile'], language=None)
+            else:
+                st.caption("No traced chat turns yet for this view.")
 
 # Main area
-if st.session_state.current_project:
+if st.session_state.current_project == CROSS_PROJECT:
+    cross_projects = st.session_state.cross_projects
+    st.title(f"💬 Chat across {len(cross_projects)} projects")
+    st.caption(", ".join(cross_projects))
+    
+    col1, col2 = st.columns([6, 1])
+    with col2:
+        if st.button("🗑️ Clear Chat", help="Clear cross-project chat history"):
+            if clear_chat_history(CROSS_PROJECT):
+                st.session_state.chat_history = []
+                st.session_state.chat_has_older = False
+                st.rerun()
+    
+    if st.session_state.chat_has_older and st.session_state.chat_history:
+        if st.button("⬆️ Load older messages"):
+            load_older_messages(CROSS_PROJECT)
+            st.rerun()
+    for msg in st.session_state.chat_history:
+        with st.chat_message(msg['role']):
+            st.markdown(msg['content'])
+    
+    if prompt := st.chat_input("Ask anything across the selected repositories..."):
+        st.session_state.chat_history.append({'role': 'user', 'content': prompt})
+        save_message(CROSS_PROJECT, 'user', prompt)
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        
+        with st.chat_message("assistant"):
+            try:
+                with chat_trace(CROSS_PROJECT, prompt):
+                    # One filtered query on the shared index, not one per project
+                    with span('load_chain'):
+                        qa_chain = get_cross_project_chain(cross_projects)
+                    if qa_chain:
+                        response = st.write_stream(qa_chain.stream(prompt))
+                        st.session_state.chat_history.append({'role': 'assistant', 'content': response})
+                        save_message(CROSS_PROJECT, 'assistant', response)
+                    else:
+                        st.error("Shared index not found. Re-index the projects with CROSS_PROJECT_SEARCH=1.")
+            except Exception as e:
+                error_msg = f"Error: {str(e)}"
+                st.error(error_msg)
+                st.session_state.chat_history.append({'role': 'assistant', 'content': error_msg})
+                save_message(CROSS_PROJECT, 'assistant', error_msg)
+
+elif st.session_state.current_project:
     project = st.session_state.projects[st.session_state.current_project]
     
     st.title(f"💬 Chat with {st.session_state.current_project}")
@@ -686,6 +824,7 @@ if st.session_state.current_project:
         if st.button("🗑️ Clear Chat", help="Clear chat history for this project"):
             if clear_chat_history(st.session_state.current_project):
                 st.session_state.chat_history = []
+                st.session_state.chat_has_older = False
                 st.success("✓ Chat history cleared!")
                 st.rerun()
     with col3:
@@ -693,7 +832,7 @@ if st.session_state.current_project:
             with st.spinner("Generating report..."):
                 report_file = generate_report(
                     st.session_state.current_project,
-                    st.session_state.chat_history,
+                    load_chat_history(st.session_state.current_project),
                     project
                 )
                 if report_file:
@@ -713,6 +852,15 @@ if st.session_state.current_project:
         with col1:
             st.metric("Files Indexed", project.get('files', 0))
             st.metric("Code Chunks", project.get('chunks', 0))
+            skipped = project.get('skipped') or {}
+            if skipped.get('skipped_files'):
+                st.metric("Files Skipped", skipped['skipped_files'],
+                          help=", ".join(f"{reason}: {r['files']} files, {r['bytes'] / 1024:.0f} KB"
+                                         for reason, r in skipped.get('reasons', {}).items()))
+            near_duplicates = skipped.get('near_duplicates') or {}
+            if near_duplicates.get('chunks_before'):
+                st.caption(f"Near-duplicate chunks collapsed: {near_duplicates['chunks_before']} → "
+                           f"{near_duplicates['chunks_after']} ({near_duplicates['reduction']:.0%} fewer)")
         
         with col2:
             metadata = project.get('metadata', {})
@@ -760,6 +908,12 @@ if st.session_state.current_project:
     chat_container = st.container()
     
     with chat_container:
+        # Only the most recent page is rendered; older pages load on demand
+        if st.session_state.chat_has_older and st.session_state.chat_history:
+            if st.button("⬆️ Load older messages"):
+                load_older_messages(st.session_state.current_project)
+                st.rerun()
+        
         for msg in st.session_state.chat_history:
             with st.chat_message(msg['role']):
                 st.markdown(msg['content'])
@@ -776,126 +930,38 @@ if st.session_state.current_project:
         
         # Generate response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Load models
-                    embeddings = load_embedding_model()
-                    model = load_llm()
-                    
-                    # Load vectorstore
-                    vectordb = load_vectorstore(st.session_state.current_project, embeddings)
+            try:
+                with chat_trace(st.session_state.current_project, prompt):
+                    with st.spinner("Thinking..."), span('load_chain'):
+                        # Vector store, prompt and chain are built once per project
+                        qa_chain = get_project_chain(st.session_state.current_project)
                     
-                    if vectordb:
-                        # Get project metadata for context
-                        project_meta = st.session_state.projects.get(st.session_state.current_project, {})
-                        metadata = project_meta.get('metadata', {})
-                        latest_commit = metadata.get('latest_commit', {})
-                        
-                        # Add commit context to prompt if available
-                        commit_context = ""
-                        if latest_commit:
-                            commit_context = f"""
-
-Repository Commit Information:
-- Latest Commit SHA: {latest_commit.get('sha', 'N/A')}
-- Commit Message: {latest_commit.get('message', 'N/A')}
-- Author: {latest_commit.get('author', 'N/A')}
-- Date: {latest_commit.get('date', 'N/A')}
-- Repository: {project_meta.get('url', 'N/A')}
-"""
+                    if qa_chain:
+                        # Repeat questions are answered from the cache for the indexed commit
+                        commit_sha = (project.get('last_commit') or {}).get('sha', '')
+                        with span('answer_cache'):
+                            query_vector = load_embedding_model().embed_query(prompt)
+                            response = get_answer_cache().lookup(st.session_state.current_project, commit_sha, query_vector)
+                            annotate(hit=response is not None)
                         
-                        # Create QA chain
-                        template = """You are an expert Software Repository Analysis AI Assistant with deep knowledge of multiple programming languages, software engineering, code architecture, and best practices.
-
-Your role is to help developers understand codebases across different languages and technologies by providing insightful, accurate, and actionable analysis.
-
-Supported Languages: Python, JavaScript/TypeScript, Java, C/C++, Go, Rust, Ruby, PHP, Kotlin, Swift, Scala, HTML, Markdown, and more.
-""" + commit_context + """
-
-Context from Repository:
-{context}
-
-User Question: {question}
-
-Response Guidelines:
-1. **Structure & Clarity**
-   - Start with a brief, direct answer
-   - Use ### for main sections
-   - Use bullet points (-) for lists
-   - Use numbered lists (1., 2., 3.) for sequential steps or priorities
-   - Use code blocks with ``` for code examples (always specify language)
-
-2. **Code Analysis**
-   - Explain the purpose and functionality clearly
-   - Identify patterns, architectures, and design principles
-   - Point out dependencies and relationships between components
-   - Highlight potential issues, bugs, or improvements when relevant
-   - Consider language-specific idioms and best practices
-   - Reference commit history or recent changes when relevant
-
-3. **Commit & History Awareness**
-   - When asked about "latest commit", "last push", or "recent changes", use the Repository Commit Information provided above
-   - Provide specific commit details (SHA, message, author, date) when relevant
-   - Don't say you can't access commit information - it's provided in the context
-   - Reference the commit message to understand recent changes
-
-4. **Technical Depth**
-   - Provide context about why code is written a certain way
-   - Explain technical decisions and trade-offs
-   - Reference specific functions, classes, or modules from the context
-   - Use proper technical terminology for the language being discussed
-   - Mention language-specific features or limitations
-
-5. **Actionable Insights**
-   - Suggest improvements or best practices when appropriate
-   - Provide examples or alternatives when explaining concepts
-   - Link related components or files when relevant
-   - Offer next steps or further exploration suggestions
-   - Consider cross-language comparisons when helpful
-
-6. **Formatting**
-   - Keep paragraphs concise (2-3 sentences max)
-   - Use **bold** for emphasis on key terms
-   - Use `inline code` for variable/function names
-   - Use tables for comparisons when helpful
-   - Specify language in code blocks (e.g., ```python, ```javascript)
-
-7. **Tone**
-   - Professional yet approachable
-   - Confident but not condescending
-   - Educational and helpful
-   - Assume the user has programming knowledge
-   - Adapt explanations to the language context
-
-Answer:"""
-                        
-                        prompt_template = ChatPromptTemplate.from_template(template)
-                        
-                        def format_docs(docs):
-                            return "\n\n".join(doc.page_content for doc in docs)
-                        
-                        qa_chain = (
-                            {"context": vectordb.as_retriever(search_type='mmr', search_kwargs={'k': 8}) | format_docs,
-                             "question": RunnablePassthrough()}
-                            | prompt_template
-                            | model
-                            | StrOutputParser()
-                        )
-                        
-                        response = qa_chain.invoke(prompt)
-                        st.markdown(response)
+                        if response is not None:
+                            st.markdown(response)
+                        else:
+                            # Stream tokens into the chat bubble as they are generated
+                            response = st.write_stream(qa_chain.stream(prompt))
+                            get_answer_cache().store(st.session_state.current_project, commit_sha, prompt, query_vector, response)
                         
                         # Add to history and save to database
                         st.session_state.chat_history.append({'role': 'assistant', 'content': response})
                         save_message(st.session_state.current_project, 'assistant', response)
                     else:
                         st.error("Vector database not found. Please re-index the project.")
-                
-                except Exception as e:
-                    error_msg = f"Error: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.chat_history.append({'role': 'assistant', 'content': error_msg})
-                    save_message(st.session_state.current_project, 'assistant', error_msg)
+            
+            except Exception as e:
+                error_msg = f"Error: {str(e)}"
+                st.error(error_msg)
+                st.session_state.chat_history.append({'role': 'assistant', 'content': error_msg})
+                save_message(st.session_state.current_project, 'assistant', error_msg)
 
 else:
     st.title("🤖 GitHub Repo AI Agent")